@@ -1,7 +1,7 @@
 from django.forms import ModelChoiceField, ModelForm, ValidationError
 from django.contrib import admin
+from .images import get_dimensions
 from .models import *
-from PIL import Image
 from django.utils.safestring import mark_safe
 
 from django_admin_listfilter_dropdown.filters import (DropdownFilter, ChoiceDropdownFilter, RelatedDropdownFilter)
@@ -41,22 +41,24 @@ class NotebookAdminForm(ModelForm):
     # -----------------------Вставляем изоброжение с ограничением-----------------
     def clean_image(self):
         image = self.cleaned_data['image']
-        img = Image.open(image)
+        width, height = get_dimensions(image)
         min_width, min_height = Product.MIN_RESOLUTION
         max_width, max_height = Product.MAX_RESOLUTION
         if image.size > Product.MAX_IMAGE_SIZE:
             raise ValidationError(
                 mark_safe('<span style="color:red;">Обьем изоброжения больше 6мб</span>'))
-        if img.width < min_width or img.height < min_height:
+        if width < min_width or height < min_height:
             raise ValidationError(
                 mark_safe('<span style="color:red;">Разрешение изоброжение меньше минимального</span>'))
-        if img.width > max_width or img.height > max_height:
+        if width > max_width or height > max_height:
             raise ValidationError(
                 mark_safe('<span style="color:red;">Разрешение изоброжение больше максимального</span>'))
         return image
 
 
 class NotebookAdmin(admin.ModelAdmin):
+    # __str__ выводит название категории
+    list_select_related = ('category',)
     form = NotebookAdminForm
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
@@ -66,6 +68,8 @@ class NotebookAdmin(admin.ModelAdmin):
 
 
 class SmartphoneAdmin(admin.ModelAdmin):
+    # __str__ выводит название категории
+    list_select_related = ('category',)
     change_form_template = 'admin.html'
     form = SmartphoneAdminForm
 
@@ -75,9 +79,16 @@ class SmartphoneAdmin(admin.ModelAdmin):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
+class CartProductAdmin(admin.ModelAdmin):
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_products()
+
+
 admin.site.register(Category)
 admin.site.register(Notebook, NotebookAdmin)
 admin.site.register(Smartphone, SmartphoneAdmin)
-admin.site.register(CartProduct)
+admin.site.register(CartProduct, CartProductAdmin)
 admin.site.register(Cart)
 admin.site.register(Customer)
+admin.site.register(Order)
@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class MainappConfig(AppConfig):
     name = 'mainapp'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from shop.db.health import check_connections
+        from .registry import product_types
+        from .signals import connect_signals
+        product_types.build()
+        connect_signals()
+        request_started.connect(check_connections, dispatch_uid='shop.db.health')
@@ -0,0 +1,197 @@
+"""
+Сборка статики: склейка, минификация, имена с хэшем содержимого и заранее
+сжатые .gz/.br копии. Результат лежит в STATIC_ROOT/bundles, список файлов -
+в bundles/manifest.json, теги из templatetags/assets.py берут имена оттуда.
+Без собранного манифеста (разработка) теги подключают исходные файлы.
+
+rcssmin, rjsmin и brotli необязательны (requirements-optional.txt): без них CSS
+минифицируется встроенными правилами, JS только склеивается, .br не создаются.
+"""
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+# Бандлы лежат на той же глубине, что и css/ и js/, поэтому относительные url() в CSS не меняются
+BUNDLES_DIR = 'bundles'
+MANIFEST_NAME = 'manifest.json'
+BUNDLES = {
+    'css': {
+        'shop': ['css/bootstrap.css', 'css/font-awesome.css', 'css/styles.css'],
+    },
+    'js': {
+        'shop': ['js/jquery.js', 'js/bootstrap.js', 'js/script.js'],
+    },
+}
+
+# Группа 1 - строки и комментарии /*! */, они остаются как есть; прочие комментарии вырезаются
+CSS_TOKEN_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*!.*?\*/)|/\*.*?\*/''', re.S)
+CSS_SPACE_RE = re.compile(r'\s+')
+CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css_code(source):
+    source = CSS_SPACE_RE.sub(' ', source)
+    return CSS_PUNCT_RE.sub(r'\1', source).replace(';}', '}')
+
+
+def minify_css(source):
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    result, code = [], ''
+    for index, part in enumerate(CSS_TOKEN_RE.split(source)):
+        if index % 2 == 0:
+            code += part
+        elif part is not None:
+            result.extend((minify_css_code(code), part))
+            code = ''
+    result.append(minify_css_code(code))
+    return ''.join(result).strip()
+
+
+def minify_js(source):
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    return source.strip()
+
+
+MINIFIERS = {
+    'css': (minify_css, '\n'),
+    # ';' между файлами: модуль без точки с запятой в конце не склеится со следующим
+    'js': (minify_js, ';\n'),
+}
+
+
+def bundles_root():
+    return os.path.join(settings.STATIC_ROOT, BUNDLES_DIR)
+
+
+def manifest_path():
+    return os.path.join(bundles_root(), MANIFEST_NAME)
+
+
+def read_source(path):
+    full_path = finders.find(path)
+    if full_path is None:
+        raise FileNotFoundError('Файл статики не найден: {}'.format(path))
+    with open(full_path, encoding='utf-8') as source:
+        return source.read()
+
+
+def build_bundle(kind, name, sources):
+    minify, separator = MINIFIERS[kind]
+    content = separator.join(minify(read_source(path)) for path in sources).encode('utf-8')
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    filename = '{}.{}.{}'.format(name, digest, kind)
+    return filename, content
+
+
+def write_file(path, content):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as target:
+        target.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_compressed(path, content):
+    """
+    Рядом с файлом кладет .gz и .br (если есть brotli). Возвращает размеры.
+    """
+    sizes = {'raw': len(content)}
+    gz = gzip.compress(content, compresslevel=9, mtime=0)
+    write_file(path + '.gz', gz)
+    sizes['gzip'] = len(gz)
+    if brotli is not None:
+        br = brotli.compress(content, quality=11)
+        write_file(path + '.br', br)
+        sizes['br'] = len(br)
+    return sizes
+
+
+def build_assets(bundles=None):
+    """
+    Собирает все бандлы и пишет манифест. Возвращает
+    {(тип, имя): (имя файла, размеры)}.
+    """
+    bundles = bundles or BUNDLES
+    root = bundles_root()
+    os.makedirs(root, exist_ok=True)
+    manifest = {kind: {} for kind in bundles}
+    report = {}
+    for kind, kind_bundles in bundles.items():
+        for name, sources in kind_bundles.items():
+            filename, content = build_bundle(kind, name, sources)
+            path = os.path.join(root, filename)
+            write_file(path, content)
+            report[kind, name] = filename, write_compressed(path, content)
+            manifest[kind][name] = {'file': filename, 'sources': sources}
+    write_file(manifest_path(), json.dumps(manifest, indent=2).encode('utf-8'))
+    load_manifest.cache_clear()
+    return report
+
+
+def clean_stale(keep):
+    """
+    Удаляет старые сборки, кроме файлов из keep (и их .gz/.br).
+    """
+    removed = []
+    root = bundles_root()
+    keep = set(keep) | {MANIFEST_NAME}
+    for filename in os.listdir(root):
+        base = re.sub(r'\.(gz|br)$', '', filename)
+        if base not in keep:
+            os.remove(os.path.join(root, filename))
+            removed.append(filename)
+    return removed
+
+
+@lru_cache(maxsize=None)
+def load_manifest():
+    try:
+        with open(manifest_path(), encoding='utf-8') as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return None
+
+
+def use_bundles():
+    # При разработке по умолчанию подключаем исходники, чтобы правки были видны без сборки
+    return getattr(settings, 'ASSETS_BUNDLES', not settings.DEBUG)
+
+
+def bundle_urls(kind, name):
+    """
+    URL собранного бандла или, если сборки нет, URL исходных файлов.
+    """
+    manifest = load_manifest() if use_bundles() else None
+    entry = manifest and manifest.get(kind, {}).get(name)
+    if entry is None:
+        return [static(path) for path in BUNDLES[kind][name]]
+    return [settings.STATIC_URL + posixpath.join(BUNDLES_DIR, entry['file'])]
+
+
+def built_files():
+    manifest = load_manifest() or {}
+    return {entry['file'] for kind_bundles in manifest.values() for entry in kind_bundles.values()}
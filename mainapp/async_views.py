@@ -0,0 +1,62 @@
+"""
+Асинхронные варианты страниц каталога для ASGI (settings.ASYNC_CATALOG_VIEWS).
+
+В Django 3.1 нет асинхронного ORM, поэтому независимые запросы (сайдбар,
+товар или категория, лента) запускаются параллельно в пуле потоков через
+sync_to_async(thread_sensitive=False) и собираются asyncio.gather. Рендер и
+проверка ETag переиспользуют синхронные вью из views.py.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed
+
+from .instrumentation import tracked
+from .models import Category
+from .views import BaseView, CategoryDetailView, ProductDetailView
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+@tracked
+def _run_db(func, *args, **kwargs):
+    # У каждого потока пула свое соединение: закрываем его по правилам CONN_MAX_AGE
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_db(func, *args, **kwargs):
+    return await sync_to_async(_run_db, thread_sensitive=False)(func, *args, **kwargs)
+
+
+def get_sidebar():
+    return Category.object.get_categories_for_left_sidebar()
+
+
+async def base_view(request):
+    if request.method not in SAFE_METHODS:
+        return HttpResponseNotAllowed(SAFE_METHODS)
+    categories, products = await asyncio.gather(run_db(get_sidebar), run_db(BaseView.get_products))
+    return await sync_to_async(tracked(BaseView.render_page))(request, categories, products)
+
+
+async def detail_view(view_class, request, **kwargs):
+    if request.method not in SAFE_METHODS:
+        return HttpResponseNotAllowed(SAFE_METHODS)
+    view = view_class()
+    view.setup(request, **kwargs)
+    # Сайдбар прогревает локальный кэш счетчиков, get_context_data возьмет его оттуда
+    view.object, _ = await asyncio.gather(run_db(view.get_object), run_db(get_sidebar))
+    return await sync_to_async(tracked(view.respond))()
+
+
+async def product_detail_view(request, ct_model, slug):
+    return await detail_view(ProductDetailView, request, ct_model=ct_model, slug=slug)
+
+
+async def category_detail_view(request, slug):
+    return await detail_view(CategoryDetailView, request, slug=slug)
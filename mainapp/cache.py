@@ -0,0 +1,100 @@
+import time
+
+from django.core.cache import cache
+
+SIDEBAR_CATEGORIES_KEY = 'sidebar:categories'
+SIDEBAR_COUNT_KEY = 'sidebar:count:{}'
+SIDEBAR_VERSION_KEY = 'sidebar:version'
+SPEC_TABLE_KEY = 'spec:{}:{}'
+SPEC_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class SidebarCountsCache:
+    """
+    Счетчики товаров по категориям для левого сайдбара.
+
+    Список категорий и счетчики лежат в общем кэше (settings.CACHES), счетчики
+    меняются через incr/decr из сигналов post_save/post_delete. Поверх общего
+    кэша держим локальную копию процесса на local_ttl секунд.
+    """
+
+    def __init__(self, timeout=None, local_ttl=5):
+        self.timeout = timeout
+        self.local_ttl = local_ttl
+        self._local = None
+        self._local_expires = 0
+
+    def get(self, rebuild):
+        now = time.monotonic()
+        local = self._local
+        if local is not None and now < self._local_expires:
+            return local
+        categories = self._get_shared()
+        if categories is None:
+            categories = rebuild()
+            self.set(categories)
+        self._local = categories
+        self._local_expires = now + self.local_ttl
+        return categories
+
+    def set(self, categories):
+        cache.set_many({
+            SIDEBAR_COUNT_KEY.format(c['id']): c['count'] for c in categories
+        }, self.timeout)
+        cache.set(SIDEBAR_CATEGORIES_KEY, [
+            {key: value for key, value in c.items() if key != 'count'} for c in categories
+        ], self.timeout)
+
+    def add(self, category_id, delta):
+        self._local = None
+        try:
+            cache.incr(SIDEBAR_COUNT_KEY.format(category_id), delta)
+        except ValueError:
+            # Ключ вытеснен из кэша - пересоберем все при следующем чтении
+            self.invalidate()
+            return
+        self._bump_version()
+
+    def invalidate(self):
+        self._local = None
+        cache.delete(SIDEBAR_CATEGORIES_KEY)
+        self._bump_version()
+
+    def version(self):
+        """
+        Версия счетчиков - время их последнего изменения в наносекундах (для ETag и Last-Modified).
+        """
+        version = cache.get(SIDEBAR_VERSION_KEY)
+        if version is None:
+            # Ключ вытеснен - начинаем с нового значения, чтобы старые ETag не совпали
+            cache.add(SIDEBAR_VERSION_KEY, time.time_ns(), self.timeout)
+            version = cache.get(SIDEBAR_VERSION_KEY)
+        return version
+
+    def last_modified(self):
+        return self.version() // 10 ** 9
+
+    def _bump_version(self):
+        cache.set(SIDEBAR_VERSION_KEY, time.time_ns(), self.timeout)
+
+    @staticmethod
+    def _get_shared():
+        categories = cache.get(SIDEBAR_CATEGORIES_KEY)
+        if categories is None:
+            return None
+        keys = [SIDEBAR_COUNT_KEY.format(c['id']) for c in categories]
+        counts = cache.get_many(keys)
+        if len(counts) != len(keys):
+            return None
+        return [dict(c, count=counts[key]) for c, key in zip(categories, keys)]
+
+
+sidebar_counts = SidebarCountsCache()
+
+
+def spec_table_key(model_name, pk):
+    return SPEC_TABLE_KEY.format(model_name, pk)
+
+
+def invalidate_spec_table(model_name, pk):
+    cache.delete(spec_table_key(model_name, pk))
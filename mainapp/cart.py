@@ -0,0 +1,289 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from .models import Cart, CartProduct, Customer
+from .registry import product_types
+
+ANONYMOUS_CART_COOKIE = 'cart'
+ANONYMOUS_CART_SALT = 'mainapp.cart'
+ANONYMOUS_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+
+def load_products(keys):
+    """
+    {(content_type_id, object_id), ...} -> {(content_type_id, object_id): product}
+    одним запросом на тип товара.
+    """
+    by_type = {}
+    for content_type_id, object_id in keys:
+        by_type.setdefault(content_type_id, []).append(object_id)
+    products = {}
+    for content_type_id, object_ids in by_type.items():
+        try:
+            model = product_types.for_content_type_id(content_type_id).model
+        except KeyError:
+            continue
+        for pk, product in model._base_manager.in_bulk(object_ids).items():
+            products[content_type_id, pk] = product
+    return products
+
+
+class CartService:
+    """
+    Все изменения корзины: строка и итоги корзины меняются в одной транзакции
+    через F-выражения (UPDATE ... SET x = x + delta), поэтому параллельные
+    запросы не теряют обновления.
+    """
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    @classmethod
+    def for_customer(cls, customer):
+        cart = Cart.objects.filter(owner=customer, in_order=False).first()
+        if cart is None:
+            try:
+                with transaction.atomic():
+                    cart = Cart.objects.create(owner=customer)
+            except IntegrityError:
+                # Корзину успели создать в параллельном запросе
+                cart = Cart.objects.get(owner=customer, in_order=False)
+        return cls(cart)
+
+    @staticmethod
+    def _line_key(product):
+        return product_types.for_model(product.__class__).content_type_id, product.pk
+
+    def _lines(self):
+        return CartProduct.objects.filter(cart_id=self.cart.pk)
+
+    def _update_totals(self, qty_delta, price_delta):
+        if qty_delta or price_delta:
+            Cart.objects.filter(pk=self.cart.pk).update(
+                total_products=F('total_products') + qty_delta, final_price=F('final_price') + price_delta)
+
+    def _add_line(self, content_type_id, object_id, qty, price_delta):
+        lines = self._lines().filter(content_type_id=content_type_id, object_id=object_id)
+        updated = lines.update(qtr=F('qtr') + qty, final_price=F('final_price') + price_delta)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    CartProduct.objects.create(
+                        user_id=self.cart.owner_id, cart_id=self.cart.pk, content_type_id=content_type_id,
+                        object_id=object_id, qtr=qty, final_price=price_delta)
+            except IntegrityError:
+                # Строку вставил параллельный запрос - добавляем к ней
+                lines.update(qtr=F('qtr') + qty, final_price=F('final_price') + price_delta)
+        self._update_totals(qty, price_delta)
+
+    def add(self, product, qty=1):
+        if qty < 1:
+            raise ValueError('Количество должно быть положительным')
+        content_type_id, object_id = self._line_key(product)
+        with transaction.atomic():
+            self._add_line(content_type_id, object_id, qty, product.price * qty)
+        self.refresh()
+
+    def set_quantity(self, product, qty):
+        if qty < 1:
+            return self.remove(product)
+        content_type_id, object_id = self._line_key(product)
+        with transaction.atomic():
+            line = self._lines().select_for_update().filter(
+                content_type_id=content_type_id, object_id=object_id).first()
+            if line is None:
+                self._add_line(content_type_id, object_id, qty, product.price * qty)
+            else:
+                final_price = product.price * qty
+                CartProduct.objects.filter(pk=line.pk).update(qtr=qty, final_price=final_price)
+                self._update_totals(qty - line.qtr, final_price - line.final_price)
+        self.refresh()
+
+    def remove(self, product):
+        content_type_id, object_id = self._line_key(product)
+        with transaction.atomic():
+            line = self._lines().select_for_update().filter(
+                content_type_id=content_type_id, object_id=object_id).first()
+            if line is not None:
+                line.delete()
+                self._update_totals(-line.qtr, -line.final_price)
+        self.refresh()
+
+    def add_many(self, items):
+        """
+        Добавляет {(content_type_id, object_id): qty} одной транзакцией,
+        товары загружаются одним запросом на тип.
+        """
+        products = load_products(items)
+        with transaction.atomic():
+            for key, qty in items.items():
+                product = products.get(key)
+                if product is not None and qty > 0:
+                    self._add_line(key[0], key[1], qty, product.price * qty)
+        self.refresh()
+
+    def merge(self, other):
+        """
+        Переносит строки другой корзины (например, анонимной) в эту и удаляет ее.
+        """
+        other_cart = other.cart if isinstance(other, CartService) else other
+        with transaction.atomic():
+            lines = CartProduct.objects.select_for_update().filter(cart_id=other_cart.pk)
+            for line in lines:
+                self._add_line(line.content_type_id, line.object_id, line.qtr, line.final_price)
+            other_cart.delete()
+        self.refresh()
+
+    def lines(self):
+        return [
+            dict(product=line.content_object, qtr=line.qtr, final_price=line.final_price)
+            for line in self._lines().with_products().order_by('pk')
+        ]
+
+    @property
+    def total_products(self):
+        return self.cart.total_products
+
+    @property
+    def final_price(self):
+        return self.cart.final_price
+
+    def recalculate(self):
+        totals = self._lines().aggregate(qty=Sum('qtr'), price=Sum('final_price'))
+        Cart.objects.filter(pk=self.cart.pk).update(
+            total_products=totals['qty'] or 0, final_price=totals['price'] or Decimal('0'))
+        self.refresh()
+
+    def refresh(self):
+        self.cart.refresh_from_db(fields=['total_products', 'final_price'])
+        return self.cart
+
+
+class AnonymousCart:
+    """
+    Корзина анонимного посетителя в подписанной cookie: "ct.id.qty|ct.id.qty".
+    В базу ничего не пишется до входа в аккаунт или оформления заказа.
+    """
+    MAX_LINES = 50
+
+    def __init__(self, items=None):
+        self.items = dict(items or {})
+        self.modified = False
+        self._lines = None
+
+    @classmethod
+    def from_request(cls, request):
+        raw = request.get_signed_cookie(
+            ANONYMOUS_CART_COOKIE, default=None, salt=ANONYMOUS_CART_SALT, max_age=ANONYMOUS_CART_MAX_AGE)
+        return cls(cls.decode(raw) if raw else None)
+
+    @staticmethod
+    def decode(raw):
+        items = {}
+        try:
+            for part in raw.split('|'):
+                content_type_id, object_id, qty = (int(value) for value in part.split('.'))
+                if qty > 0:
+                    items[content_type_id, object_id] = qty
+        except ValueError:
+            return {}
+        return items
+
+    def encode(self):
+        return '|'.join('{}.{}.{}'.format(ct, pk, qty) for (ct, pk), qty in self.items.items())
+
+    def save(self, response):
+        if not self.modified:
+            return
+        if self.items:
+            response.set_signed_cookie(
+                ANONYMOUS_CART_COOKIE, self.encode(), salt=ANONYMOUS_CART_SALT,
+                max_age=ANONYMOUS_CART_MAX_AGE, httponly=True, samesite='Lax')
+        else:
+            response.delete_cookie(ANONYMOUS_CART_COOKIE)
+
+    def _key(self, product):
+        return product_types.for_model(product.__class__).content_type_id, product.pk
+
+    def _changed(self):
+        self.modified = True
+        self._lines = None
+
+    def add(self, product, qty=1):
+        if qty < 1:
+            raise ValueError('Количество должно быть положительным')
+        key = self._key(product)
+        if key not in self.items and len(self.items) >= self.MAX_LINES:
+            raise ValueError('Слишком много товаров в корзине')
+        self.items[key] = self.items.get(key, 0) + qty
+        self._changed()
+
+    def set_quantity(self, product, qty):
+        if qty < 1:
+            return self.remove(product)
+        key = self._key(product)
+        if key not in self.items and len(self.items) >= self.MAX_LINES:
+            raise ValueError('Слишком много товаров в корзине')
+        self.items[key] = qty
+        self._changed()
+
+    def remove(self, product):
+        if self.items.pop(self._key(product), None) is not None:
+            self._changed()
+
+    def clear(self):
+        if self.items:
+            self.items = {}
+            self._changed()
+
+    def __len__(self):
+        return len(self.items)
+
+    def lines(self):
+        # Товары загружаются один раз, итоги считаются по тем же строкам
+        if self._lines is None:
+            products = load_products(self.items)
+            if len(products) < len(self.items):
+                # Удаленные товары убираются и из cookie
+                self.items = {key: qty for key, qty in self.items.items() if key in products}
+                self.modified = True
+            self._lines = [
+                dict(product=products[key], qtr=qty, final_price=products[key].price * qty)
+                for key, qty in self.items.items()
+            ]
+        return self._lines
+
+    @property
+    def total_products(self):
+        return sum(line['qtr'] for line in self.lines())
+
+    @property
+    def final_price(self):
+        return sum((line['final_price'] for line in self.lines()), Decimal('0'))
+
+
+def get_customer(user):
+    try:
+        customer, _ = Customer.objects.get_or_create(user=user)
+    except IntegrityError:
+        # Покупателя успели создать в параллельном запросе
+        customer = Customer.objects.get(user=user)
+    return customer
+
+
+def get_cart(request):
+    """
+    CartService для вошедшего пользователя, AnonymousCart (cookie) - для остальных.
+    """
+    if request.user.is_authenticated:
+        return CartService.for_customer(get_customer(request.user))
+    return request.anonymous_cart
+
+
+def merge_anonymous_cart(request, user):
+    anonymous_cart = getattr(request, 'anonymous_cart', None)
+    if anonymous_cart:
+        CartService.for_customer(get_customer(user)).add_many(anonymous_cart.items)
+        anonymous_cart.clear()
@@ -0,0 +1,309 @@
+"""
+Потоковый импорт и экспорт товаров в CSV и JSON Lines.
+
+Строки читаются генераторами и обрабатываются пачками по batch_size, так что
+память не зависит от размера файла. Заголовки изображений проверяются в пуле
+потоков, товары пишутся bulk_create/bulk_update в транзакции на пачку.
+Массовые операции не вызывают сигналы, поэтому кэши, витрина каталога и
+поисковый индекс для записанных товаров обновляются самим импортом.
+"""
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import sidebar_counts, spec_table_key
+from .images import get_dimensions
+from .models import CatalogEntry, Category, MaxResolutionErrorException, MinResolutionErrorException
+from .pagecache import HOME_TAG, SIDEBAR_TAG, category_tag, product_tag, purge_tags
+from .registry import product_types
+from .search import get_document, get_search_backend
+from .storage import product_image_storage
+
+TYPE_COLUMN = 'type'
+CATEGORY_COLUMN = 'category'
+IMAGE_COLUMN = 'image'
+BASE_FIELDS = ('title', 'slug', 'description', 'price', 'stock')
+
+
+class RowError(Exception):
+    pass
+
+
+def export_columns(types=None):
+    columns = [TYPE_COLUMN, CATEGORY_COLUMN, *BASE_FIELDS, IMAGE_COLUMN]
+    for product_type in types or product_types:
+        columns.extend(field for field in product_type.spec_fields if field not in columns)
+    return columns
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                # Ошибка одной строки, а не всего импорта: CatalogImporter сообщит о ней с номером
+                yield RowError('Некорректный JSON: {}'.format(exc))
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def write_csv(stream, rows, columns):
+    writer = csv.DictWriter(stream, columns, extrasaction='ignore')
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(stream, rows, columns):
+    count = 0
+    for row in rows:
+        stream.write(json.dumps({k: row.get(k) for k in columns if k in row}, ensure_ascii=False, default=str))
+        stream.write('\n')
+        count += 1
+    return count
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+}
+
+
+def export_rows(types=None, chunk_size=2000):
+    """
+    Товары в виде словарей по колонкам export_columns(), порциями из базы.
+    """
+    for product_type in types or product_types:
+        fields = [*BASE_FIELDS, IMAGE_COLUMN, *product_type.spec_fields]
+        qs = product_type.model._base_manager.order_by('pk').values(*fields, category_slug=F('category__slug'))
+        for row in qs.iterator(chunk_size=chunk_size):
+            row[TYPE_COLUMN] = product_type.ct_model
+            row[CATEGORY_COLUMN] = row.pop('category_slug')
+            yield row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class ImportStats:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return 'строк: {}, создано: {}, обновлено: {}, ошибок: {}, {:.1f} с, {:.0f} строк/с'.format(
+            self.rows, self.created, self.updated, self.errors, self.elapsed, self.rate)
+
+
+class CatalogImporter:
+    """
+    Товар определяется типом и slug: существующие обновляются, новые создаются.
+    Колонка image - имя файла в хранилище товаров либо путь к файлу
+    (абсолютный или относительно images_dir), который копируется в хранилище.
+    """
+
+    def __init__(self, batch_size=1000, workers=4, images_dir=None, dry_run=False, rebuild=True, on_error=None):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.images_dir = images_dir
+        self.dry_run = dry_run
+        self.rebuild = rebuild
+        self.on_error = on_error
+        self.stats = ImportStats()
+        self.categories = dict(Category.object.values_list('slug', 'pk'))
+
+    def run(self, rows, progress=None):
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='catalog-import') as executor:
+            numbered = enumerate(rows, start=1)
+            for batch in batched(numbered, self.batch_size):
+                self.import_batch(batch, executor)
+                if progress is not None:
+                    progress(self.stats)
+        self.finish()
+        return self.stats
+
+    def error(self, number, message):
+        self.stats.errors += 1
+        if self.on_error is not None:
+            self.on_error(number, message)
+
+    def parse_row(self, row):
+        if isinstance(row, RowError):
+            raise row
+        if not isinstance(row, dict):
+            raise RowError('Строка должна быть объектом')
+        try:
+            product_type = product_types.get(row.get(TYPE_COLUMN) or '')
+        except KeyError:
+            raise RowError('Неизвестный тип товара: {!r}'.format(row.get(TYPE_COLUMN)))
+        category_id = self.categories.get(row.get(CATEGORY_COLUMN))
+        if category_id is None:
+            raise RowError('Неизвестная категория: {!r}'.format(row.get(CATEGORY_COLUMN)))
+        if not row.get('slug'):
+            raise RowError('Не указан slug')
+        model = product_type.model
+        values = {'category_id': category_id}
+        for name in (*BASE_FIELDS, *product_type.spec_fields):
+            if name not in row:
+                continue
+            field = model._meta.get_field(name)
+            raw = row[name]
+            if raw in ('', None) and field.null:
+                raw = None
+            try:
+                values[name] = field.clean(raw, None)
+            except ValidationError as exc:
+                raise RowError('{}: {}'.format(name, '; '.join(exc.messages)))
+        return product_type, values, row.get(IMAGE_COLUMN) or ''
+
+    def prepare_image(self, model, value):
+        """
+        Проверяет размеры по заголовку и кладет файл в хранилище. Выполняется в пуле потоков.
+        """
+        if not os.path.isabs(value) and product_image_storage.exists(value):
+            return value
+        path = value if os.path.isabs(value) or not self.images_dir else os.path.join(self.images_dir, value)
+        if not os.path.isfile(path):
+            raise RowError('Файл изображения не найден: {}'.format(value))
+        with open(path, 'rb') as source:
+            image = File(source, name=os.path.basename(path))
+            try:
+                model.check_resolution(*get_dimensions(image))
+            except (ValueError, MinResolutionErrorException, MaxResolutionErrorException) as exc:
+                raise RowError('{}: {}'.format(value, exc))
+            if self.dry_run:
+                return value
+            image.seek(0)
+            return product_image_storage.save(image.name, image)
+
+    def import_batch(self, batch, executor):
+        self.stats.rows += len(batch)
+        parsed = []
+        for number, row in batch:
+            try:
+                product_type, values, image = self.parse_row(row)
+            except RowError as exc:
+                self.error(number, str(exc))
+                continue
+            future = executor.submit(self.prepare_image, product_type.model, image) if image else None
+            parsed.append((number, product_type, values, future))
+
+        by_type = {}
+        for number, product_type, values, future in parsed:
+            try:
+                image_name = future.result() if future is not None else None
+            except (RowError, OSError, SuspiciousFileOperation) as exc:
+                self.error(number, str(exc))
+                continue
+            # Повтор slug в пачке: побеждает последняя строка
+            by_type.setdefault(product_type, {})[values['slug']] = (number, values, image_name)
+
+        with transaction.atomic():
+            touched = {'products': [], 'categories': set()}
+            for product_type, items in by_type.items():
+                self.save_products(product_type, items, touched)
+            if touched['categories']:
+                Category.object.filter(pk__in=touched['categories']).update(updated_at=timezone.now())
+            if self.dry_run:
+                transaction.set_rollback(True)
+            else:
+                transaction.on_commit(lambda: self.invalidate(touched))
+
+    def save_products(self, product_type, items, touched):
+        model = product_type.model
+        # Чтение перед записью - из основной базы, а не с реплики
+        products = model._base_manager.db_manager(router.db_for_write(model))
+        existing = products.filter(slug__in=list(items)).in_bulk(field_name='slug')
+        now = timezone.now()
+        new, changed, update_fields = [], [], {'updated_at'}
+        for slug, (number, values, image_name) in items.items():
+            product = existing.get(slug)
+            if product is None:
+                if not image_name:
+                    self.error(number, 'У нового товара нет изображения')
+                    continue
+                new.append(model(image=image_name, **values))
+                touched['categories'].add(values['category_id'])
+                continue
+            touched['categories'].update({product.category_id, values['category_id']})
+            for name, value in values.items():
+                setattr(product, name, value)
+            update_fields.update(values)
+            if image_name and image_name != product.image.name:
+                product.image = image_name
+                product.image_hash = ''
+                update_fields.update({'image', 'image_hash'})
+            product.updated_at = now
+            changed.append(product)
+        model._base_manager.bulk_create(new, batch_size=self.batch_size)
+        if changed:
+            fields = ['category' if name == 'category_id' else name for name in sorted(update_fields)]
+            model._base_manager.bulk_update(changed, fields, batch_size=self.batch_size)
+        touched['products'].extend(changed)
+        self.stats.created += len(new)
+        self.stats.updated += len(changed)
+        if self.rebuild:
+            # bulk_create на SQLite не возвращает id: новые товары перечитываются по slug
+            saved = changed + list(products.filter(slug__in=[product.slug for product in new]))
+            self.sync_catalog(product_type, saved)
+
+    @staticmethod
+    def sync_catalog(product_type, products):
+        entry_ids = CatalogEntry.objects.sync_many(product_type, products)
+        get_search_backend().index_many(
+            (entry_ids[product.pk], get_document(product, product_type)) for product in products)
+
+    @staticmethod
+    def invalidate(touched):
+        products = touched['products']
+        cache.delete_many([spec_table_key(product._meta.model_name, product.pk) for product in products])
+        purge_tags(*(product_tag(product) for product in products),
+                   *(category_tag(category_id) for category_id in touched['categories']))
+
+    def finish(self):
+        if self.dry_run or not (self.stats.created or self.stats.updated):
+            return
+        # Сигналы при bulk_create/bulk_update не срабатывают
+        sidebar_counts.invalidate()
+        purge_tags(SIDEBAR_TAG, HOME_TAG)
@@ -0,0 +1,124 @@
+import re
+
+from django.db.models import Count
+
+from .registry import product_types
+
+SPEC_PARAM_PREFIX = 'spec_'
+NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+
+def normalize_spec_value(value):
+    """
+    Приводит значение характеристики к виду (текст, число) для индексации.
+    '2,4 ГГц' -> ('2.4 ггц', 2.4), True -> ('да', None).
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return ('да' if value else 'нет'), None
+    text = ' '.join(str(value).split()).lower().replace(',', '.')
+    if not text:
+        return None
+    match = NUMBER_RE.search(text)
+    return text[:255], float(match.group()) if match else None
+
+
+def get_facet_labels():
+    labels = {}
+    for product_type in product_types:
+        for label, field in product_type.spec.items():
+            labels.setdefault(field, label)
+    return labels
+
+
+def build_spec_values(entry):
+    from .models import SpecValue
+    spec_values = []
+    for field, value in entry.specs.items():
+        normalized = normalize_spec_value(value)
+        if normalized is not None:
+            text, number = normalized
+            spec_values.append(SpecValue(
+                entry_id=entry.id, category_id=entry.category_id, field=field, value=text, number=number))
+    return spec_values
+
+
+def parse_spec_filters(params):
+    """
+    Фильтры из GET: spec_ram=8&spec_ram=16 (ИЛИ внутри поля),
+    spec_diagonal_min=15&spec_diagonal_max=17 (числовой диапазон).
+    """
+    fields = get_facet_labels()
+    values, ranges = {}, {}
+    for key in params:
+        if not key.startswith(SPEC_PARAM_PREFIX):
+            continue
+        name = key[len(SPEC_PARAM_PREFIX):]
+        for suffix, bound in (('_min', 'gte'), ('_max', 'lte')):
+            if name.endswith(suffix) and name[:-len(suffix)] in fields:
+                try:
+                    ranges.setdefault(name[:-len(suffix)], {})[bound] = float(params[key].replace(',', '.'))
+                except ValueError:
+                    pass
+                break
+        else:
+            if name in fields:
+                selected = [value for value in params.getlist(key) if value]
+                if selected:
+                    values[name] = selected
+    return values, ranges
+
+
+def filter_by_specs(queryset, values, ranges):
+    from .models import SpecValue
+    for field, selected in values.items():
+        queryset = queryset.filter(id__in=SpecValue.objects.filter(
+            field=field, value__in=selected).values('entry_id'))
+    for field, bounds in ranges.items():
+        lookups = {'number__{}'.format(bound): value for bound, value in bounds.items()}
+        queryset = queryset.filter(id__in=SpecValue.objects.filter(
+            field=field, **lookups).values('entry_id'))
+    return queryset
+
+
+def get_facets(category, queryset, values, ranges, filtered):
+    """
+    Счетчики значений характеристик. queryset - товары категории без фильтров
+    по характеристикам, filtered - есть ли на нем другие фильтры (цена).
+
+    Значения поля считаются по товарам, отфильтрованным всеми остальными
+    полями, но не им самим: иначе после выбора одного значения остальные
+    значения поля обнуляются и выбрать несколько (ИЛИ) нельзя. Поля без
+    фильтра считаются одним GROUP BY запросом, плюс запрос на каждое выбранное поле.
+    """
+    from .models import SpecValue
+    selected_fields = set(values) | set(ranges)
+    groups = [(None, values, ranges)]
+    for field in sorted(selected_fields):
+        groups.append((
+            field,
+            {name: selected for name, selected in values.items() if name != field},
+            {name: bounds for name, bounds in ranges.items() if name != field},
+        ))
+    rows = []
+    for field, other_values, other_ranges in groups:
+        spec_values = SpecValue.objects.filter(category=category)
+        if field is None:
+            spec_values = spec_values.exclude(field__in=selected_fields)
+        else:
+            spec_values = spec_values.filter(field=field)
+        if filtered or other_values or other_ranges:
+            entries = filter_by_specs(queryset, other_values, other_ranges)
+            spec_values = spec_values.filter(entry_id__in=entries.values('id'))
+        rows.extend(spec_values.values_list('field', 'value').annotate(count=Count('id')).order_by('field', 'value'))
+    rows.sort(key=lambda row: (row[0], row[1]))
+    labels = get_facet_labels()
+    facets = {}
+    for field, value, count in rows:
+        facet = facets.get(field)
+        if facet is None:
+            facet = facets[field] = {'field': field, 'label': labels.get(field, field), 'values': [],
+                                     'param': SPEC_PARAM_PREFIX + field}
+        facet['values'].append({'value': value, 'count': count, 'selected': value in values.get(field, ())})
+    return list(facets.values())
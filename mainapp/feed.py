@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from django.db import models
+from django.utils.dateparse import parse_datetime
+
+from .registry import product_types
+
+FEED_FIELDS = ('id', 'category_id', 'title', 'slug', 'image', 'image_hash', 'description', 'price', 'created_at',
+               'updated_at')
+
+
+class FeedPage:
+
+    def __init__(self, products, next_cursor):
+        self.products = products
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __len__(self):
+        return len(self.products)
+
+
+def encode_cursor(product):
+    return '{}_{}_{}'.format(
+        product.created_at.isoformat(), product_types.for_model(product.__class__).content_type_id, product.pk)
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, content_type_id, pk = cursor.rsplit('_', 2)
+        created_at = parse_datetime(created_at)
+        if not isinstance(created_at, datetime):
+            raise ValueError(cursor)
+        return created_at, int(content_type_id), int(pk)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError('Некорректный курсор ленты: {!r}'.format(cursor))
+
+
+def _feed_queryset(product_type, cursor):
+    content_type_id = product_type.content_type_id
+    qs = product_type.model._base_manager.all()
+    if cursor is not None:
+        created_at, cursor_content_type_id, pk = cursor
+        # Порядок ленты: (created_at, content_type_id, id) по убыванию
+        if content_type_id < cursor_content_type_id:
+            qs = qs.filter(created_at__lte=created_at)
+        elif content_type_id == cursor_content_type_id:
+            qs = qs.filter(models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=pk))
+        else:
+            qs = qs.filter(created_at__lt=created_at)
+    return qs.annotate(
+        ct=models.Value(content_type_id, output_field=models.IntegerField())
+    ).values_list('ct', *FEED_FIELDS)
+
+
+def get_feed(ct_models=None, count=15, cursor=None):
+    """
+    Последние товары всех типов одним запросом UNION ALL.
+
+    Строки сразу превращаются в экземпляры моделей через Model.from_db(),
+    поля характеристик при этом остаются отложенными (deferred).
+    """
+    if ct_models:
+        types = [product_types.get(ct_model) for ct_model in ct_models if ct_model in product_types]
+    else:
+        types = list(product_types)
+    if not types:
+        return FeedPage([], None)
+    if cursor is not None:
+        cursor = decode_cursor(cursor)
+    querysets = [_feed_queryset(product_type, cursor) for product_type in types]
+    qs = querysets[0]
+    if len(querysets) > 1:
+        qs = qs.union(*querysets[1:], all=True)
+    rows = list(qs.order_by('-created_at', '-ct', '-id')[:count + 1])
+
+    products = []
+    for row in rows[:count]:
+        model = product_types.for_content_type_id(row[0]).model
+        products.append(model.from_db(qs.db, FEED_FIELDS, row[1:]))
+    next_cursor = encode_cursor(products[-1]) if len(rows) > count else None
+    return FeedPage(products, next_cursor)
@@ -0,0 +1,11 @@
+from django import forms
+
+from .models import Order
+
+
+class OrderForm(forms.ModelForm):
+    idempotency_key = forms.CharField(max_length=64, widget=forms.HiddenInput)
+
+    class Meta:
+        model = Order
+        fields = ('phone', 'address')
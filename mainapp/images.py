@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+from .pagecache import HOME_TAG, product_tag, purge_tags
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (200, 200),
+    'card': (700, 400),
+    'detail': (900, 900),
+}
+RENDITION_FORMATS = {
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+RENDITIONS_DIR = 'renditions'
+
+_executor = None
+
+
+def get_dimensions(image):
+    """
+    Размеры изображения по заголовку файла, без полного декодирования.
+    """
+    width, height = get_image_dimensions(image)
+    if width is None or height is None:
+        raise ValueError('Не удалось прочитать размеры изображения')
+    return width, height
+
+
+def file_hash(image, chunk_size=64 * 1024):
+    sha = hashlib.sha1()
+    image.open('rb')
+    try:
+        image.seek(0)
+        for chunk in image.chunks(chunk_size):
+            sha.update(chunk)
+    finally:
+        image.seek(0)
+    return sha.hexdigest()
+
+
+def rendition_name(image_hash, rendition, extension):
+    return posixpath.join(RENDITIONS_DIR, image_hash[:2], '{}_{}.{}'.format(image_hash, rendition, extension))
+
+
+def rendition_url(image_hash, rendition, extension='jpg'):
+    return default_storage.url(rendition_name(image_hash, rendition, extension))
+
+
+def generate_renditions(image):
+    """
+    Создает все варианты изображения. Имена зависят только от содержимого
+    исходника, поэтому повторный запуск ничего не перезаписывает.
+    """
+    storage = default_storage
+    image_hash = file_hash(image)
+    with Image.open(image) as source:
+        source.load()
+        source = source.convert('RGB')
+    for rendition, size in RENDITIONS.items():
+        resized = source.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        for extension, (image_format, options) in RENDITION_FORMATS.items():
+            name = rendition_name(image_hash, rendition, extension)
+            if storage.exists(name):
+                continue
+            stream = BytesIO()
+            resized.save(stream, image_format, **options)
+            storage.save(name, ContentFile(stream.getvalue()))
+    return image_hash
+
+
+def process_product_image(model, pk, image_name):
+    try:
+        product = model._base_manager.filter(pk=pk, image=image_name).first()
+        if product is None:
+            return
+        image_hash = generate_renditions(product.image)
+        # update() вместо save(): не трогаем updated_at и не вызываем сигналы повторно
+        model._base_manager.filter(pk=pk, image=image_name).update(image_hash=image_hash)
+        purge_tags(product_tag(product), HOME_TAG)
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', image_name)
+
+
+def _process_in_worker(*args):
+    close_old_connections()
+    try:
+        process_product_image(*args)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_WORKERS', 2), thread_name_prefix='image-renditions')
+    return _executor
+
+
+def schedule_renditions(product):
+    args = (product.__class__, product.pk, product.image.name)
+    if getattr(settings, 'IMAGE_RENDITIONS_ASYNC', True):
+        get_executor().submit(_process_in_worker, *args)
+    else:
+        process_product_image(*args)
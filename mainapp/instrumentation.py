@@ -0,0 +1,242 @@
+"""
+Метрики запроса: число и время SQL-запросов, время рендера шаблонов,
+попадания и промахи кэша, общее время.
+
+Текущие метрики лежат в ContextVar, поэтому учитываются и запросы из потоков
+sync_to_async (асинхронные вью). Классы Django не меняются:
+- SQL: connection.execute_wrapper() на соединениях потока только внутри
+  track(), то есть на время запроса из выборки;
+- шаблоны: бэкенд InstrumentedDjangoTemplates в settings.TEMPLATES;
+- кэш: get/get_many оборачиваются у экземпляров кэша потока (wrap_cache).
+Когда запрос не попал в выборку, обертки шаблонов и кэша только читают ContextVar.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+current_metrics = ContextVar('request_metrics', default=None)
+
+_MISSING = object()
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
+    def add_query(self, duration):
+        # Запросы могут идти из нескольких потоков одновременно (asyncio.gather)
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+
+    def add_cache(self, hits, misses):
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            'db;dur={:.1f};desc="{} queries"'.format(self.db_time * 1000, self.queries),
+            'tpl;dur={:.1f}'.format(self.template_time * 1000),
+            'cache;desc="{} hit, {} miss"'.format(self.cache_hits, self.cache_misses),
+            'total;dur={:.1f}'.format(self.total * 1000),
+        ])
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2),
+            'queries': self.queries,
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def query_wrapper(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - started)
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Вложенные render_to_string уже входят во время внешнего шаблона
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    DjangoTemplates, шаблоны которого учитывают время рендера в метриках запроса.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def wrap_cache_get(get):
+    def counted_get(key, default=None, version=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return get(key, default, version)
+        value = get(key, _MISSING, version)
+        if value is _MISSING:
+            metrics.add_cache(0, 1)
+            return default
+        metrics.add_cache(1, 0)
+        return value
+    return counted_get
+
+
+def wrap_cache_get_many(get_many):
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.add_cache(len(values), len(keys) - len(values))
+        return values
+    return counted_get_many
+
+
+def wrap_cache(cache):
+    """
+    Оборачивает get/get_many одного экземпляра кэша, повторный вызов ничего не делает.
+    """
+    if getattr(cache, '_instrumented', False):
+        return
+    cache.get = wrap_cache_get(cache.get)
+    # BaseCache.get_many вызывает get() - иначе попадания посчитались бы дважды
+    if type(cache).get_many is not BaseCache.get_many:
+        cache.get_many = wrap_cache_get_many(cache.get_many)
+    cache._instrumented = True
+
+
+@contextmanager
+def track():
+    """
+    Учет SQL и кэша текущего потока для запроса из выборки. Соединения и
+    экземпляры кэша у каждого потока свои, поэтому track() нужен в каждом
+    потоке, где выполняется запрос (см. tracked).
+    """
+    if current_metrics.get() is None:
+        yield
+        return
+    for alias in settings.CACHES:
+        wrap_cache(caches[alias])
+    with ExitStack() as stack:
+        for connection in connections.all():
+            if query_wrapper not in connection.execute_wrappers:
+                stack.enter_context(connection.execute_wrapper(query_wrapper))
+        yield
+
+
+def tracked(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with track():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def percentile(sorted_values, p):
+    """Перцентиль по ближайшему рангу из отсортированного списка."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, -(-len(sorted_values) * p // 100) - 1)]
+
+
+class RollingHistogram:
+    """
+    Последние window запросов по каждому вью: перцентили и гистограмма по корзинам.
+    """
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, metrics):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append((metrics.total * 1000, metrics.db_time * 1000, metrics.queries))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+        result = {}
+        for name, values in samples.items():
+            totals = sorted(total for total, _, _ in values)
+            buckets = [0] * (len(self.BUCKETS_MS) + 1)
+            for total in totals:
+                buckets[bisect_left(self.BUCKETS_MS, total)] += 1
+            result[name] = {
+                'count': len(values),
+                'p50_ms': round(percentile(totals, 50), 2),
+                'p95_ms': round(percentile(totals, 95), 2),
+                'p99_ms': round(percentile(totals, 99), 2),
+                'max_ms': round(totals[-1], 2),
+                'db_ms_avg': round(sum(db for _, db, _ in values) / len(values), 2),
+                'queries_avg': round(sum(q for _, _, q in values) / len(values), 2),
+                'queries_max': max(q for _, _, q in values),
+                'buckets_ms': {
+                    ('<={}'.format(bound) if bound is not None else '>{}'.format(self.BUCKETS_MS[-1])): count
+                    for bound, count in zip((*self.BUCKETS_MS, None), buckets)
+                },
+            }
+        return result
+
+
+histogram = RollingHistogram()
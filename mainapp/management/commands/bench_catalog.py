@@ -0,0 +1,107 @@
+import random
+import shutil
+import tempfile
+import time
+from itertools import cycle, islice
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.urls import reverse
+
+from mainapp.cache import sidebar_counts
+from mainapp.instrumentation import percentile
+from mainapp.models import Category
+from mainapp.registry import product_types
+from mainapp.seeding import CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Воспроизводимый замер страниц каталога через тестовый клиент: создает отдельную тестовую базу, '
+        'заполняет ее синтетическим каталогом (mainapp/seeding.py) и меряет запросы/с и задержки p50/p99 '
+        'по группам страниц. Рабочая база и media не затрагиваются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notebooks', type=int, default=1000)
+        parser.add_argument('--smartphones', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=300, help='Запросов на группу страниц')
+        parser.add_argument('--warmup', type=int, default=20, help='Прогревочных запросов на группу')
+        parser.add_argument('--products', type=int, default=50, help='Сколько разных товаров каждого типа открывать')
+        parser.add_argument('--page-cache', action='store_true', help='Мерить с кэшем страниц')
+        parser.add_argument('--max-p99', type=float, help='Ошибка, если p99 какой-либо группы больше, мс')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        media_root = tempfile.mkdtemp(prefix='shop-bench-')
+        try:
+            with override_settings(MEDIA_ROOT=media_root, PAGE_CACHE_ENABLED=options['page_cache'],
+                                   INSTRUMENTATION_SAMPLE_RATE=0):
+                self.clear_caches()
+                stats = CatalogSeeder(seed=options['seed']).run({
+                    'notebook': options['notebooks'],
+                    'smartphone': options['smartphones'],
+                })
+                self.stdout.write('Каталог: {}'.format(stats))
+                results = self.run_groups(self.get_groups(options), options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+            self.clear_caches()
+
+        slow = [name for name, p99 in results if options['max_p99'] is not None and p99 > options['max_p99']]
+        if slow:
+            raise CommandError('p99 больше {} мс: {}'.format(options['max_p99'], ', '.join(slow)))
+
+    @staticmethod
+    def clear_caches():
+        for alias in ('default', 'pages'):
+            caches[alias].clear()
+        sidebar_counts.invalidate()
+
+    @staticmethod
+    def get_groups(options):
+        rng = random.Random(options['seed'])
+        products = []
+        for product_type in product_types:
+            pks = list(product_type.model._base_manager.values_list('pk', flat=True))
+            sample = rng.sample(pks, min(options['products'], len(pks)))
+            products.extend(
+                product.get_absolute_url() for product in product_type.model._base_manager.filter(pk__in=sample))
+        return [
+            ('home', [reverse('base')]),
+            ('category', [category.get_absolute_url() for category in Category.object.all()]),
+            ('product', products),
+            ('search', [reverse('search') + '?q=' + query for query in ('Lenovo', 'Galaxy', 'IPS', '16')]),
+        ]
+
+    def run_groups(self, groups, options):
+        client = Client()
+        results = []
+        for name, paths in groups:
+            if not paths:
+                continue
+            for path in islice(cycle(paths), options['warmup']):
+                client.get(path)
+            latencies, errors = [], 0
+            started = time.perf_counter()
+            for path in islice(cycle(paths), options['requests']):
+                request_started = time.perf_counter()
+                response = client.get(path)
+                latencies.append((time.perf_counter() - request_started) * 1000)
+                errors += response.status_code >= 400
+            elapsed = time.perf_counter() - started
+            latencies.sort()
+            p99 = percentile(latencies, 99)
+            self.stdout.write('{:<9} страниц: {:>3}, ошибок: {}, {:.1f} запросов/с, p50 {:.1f} мс, p99 {:.1f} мс, '
+                              'max {:.1f} мс'.format(name, len(paths), errors, len(latencies) / elapsed,
+                                                     percentile(latencies, 50), p99, latencies[-1]))
+            if errors:
+                raise CommandError('Страницы группы {} отвечают ошибками'.format(name))
+            results.append((name, p99))
+        return results
@@ -0,0 +1,82 @@
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp.instrumentation import percentile
+from mainapp.models import Category
+from mainapp.registry import product_types
+
+
+def default_paths(products_per_type=5):
+    paths = ['/']
+    paths.extend(category.get_absolute_url() for category in Category.object.all())
+    for product_type in product_types:
+        products = product_type.model._base_manager.order_by('-pk')[:products_per_type]
+        paths.extend(product.get_absolute_url() for product in products)
+    return paths
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер страниц каталога по HTTP: задержки p50/p90/p99 при заданной конкурентности. '
+        'Для сравнения WSGI и ASGI запустите по очереди, например, '
+        '"gunicorn shop.wsgi -w 4" и "uvicorn shop.asgi:application --workers 4" '
+        '(с PAGE_CACHE=0, чтобы мерить сами вью) и прогоните команду против каждого.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('base_url', help='Например, http://127.0.0.1:8000')
+        parser.add_argument('paths', nargs='*', help='По умолчанию: главная, категории и последние товары')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--header', action='append', default=[], help='Заголовок "Имя: значение"')
+        parser.add_argument('--label', default='')
+
+    def handle(self, *args, **options):
+        base_url = options['base_url'].rstrip('/')
+        paths = options['paths'] or default_paths()
+        headers = {}
+        for header in options['header']:
+            name, sep, value = header.partition(':')
+            if not sep:
+                raise CommandError('Заголовок должен быть в виде "Имя: значение": {}'.format(header))
+            headers[name.strip()] = value.strip()
+        timeout = options['timeout']
+
+        def fetch(path):
+            request = urllib.request.Request(base_url + path, headers=headers)
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    response.read()
+                    ok = response.status < 500
+            except urllib.error.HTTPError as exc:
+                ok = exc.code < 500
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            list(executor.map(fetch, islice(cycle(paths), options['warmup'])))
+            started = time.perf_counter()
+            results = list(executor.map(fetch, islice(cycle(paths), options['requests'])))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for latency, ok in results if ok)
+        errors = sum(1 for _, ok in results if not ok)
+        self.stdout.write('{}страниц: {}, запросов: {}, ошибок: {}, конкурентность: {}'.format(
+            '[{}] '.format(options['label']) if options['label'] else '',
+            len(paths), len(results), errors, options['concurrency']))
+        if not latencies:
+            raise CommandError('Ни одного успешного запроса')
+        self.stdout.write('{:.1f} запросов/с, среднее {:.1f} мс, p50 {:.1f} мс, p90 {:.1f} мс, '
+                          'p99 {:.1f} мс, max {:.1f} мс'.format(
+                              len(results) / elapsed, sum(latencies) / len(latencies),
+                              percentile(latencies, 50), percentile(latencies, 90),
+                              percentile(latencies, 99), latencies[-1]))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.assets import brotli, build_assets, clean_stale
+
+
+class Command(BaseCommand):
+    help = 'Собирает CSS/JS бандлы: склейка, минификация, хэш в имени, .gz/.br копии'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clean', action='store_true', help='Удалить предыдущие сборки')
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stderr.write('Модуль brotli не установлен, .br файлы не создаются')
+        report = build_assets()
+        for (kind, name), (filename, sizes) in sorted(report.items()):
+            self.stdout.write('{}: {} ({})'.format(
+                name, filename, ', '.join('{} {} байт'.format(k, v) for k, v in sizes.items())))
+        if options['clean']:
+            removed = clean_stale(filename for filename, _ in report.values())
+            self.stdout.write('Удалено старых файлов: {}'.format(len(removed)))
+        self.stdout.write(self.style.SUCCESS('Собрано бандлов: {}'.format(len(report))))
@@ -0,0 +1,38 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp.catalog_io import WRITERS, export_columns, export_rows
+from mainapp.registry import product_types
+
+
+class Command(BaseCommand):
+    help = 'Выгружает товары в CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или "-" для stdout')
+        parser.add_argument('--format', choices=sorted(WRITERS), help='По умолчанию - по расширению файла')
+        parser.add_argument('--type', action='append', dest='types', choices=[t.ct_model for t in product_types],
+                            help='Тип товара (можно несколько раз), по умолчанию все')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in WRITERS:
+            raise CommandError('Укажите --format: {}'.format(', '.join(sorted(WRITERS))))
+        types = [product_types.get(ct_model) for ct_model in options['types'] or []] or None
+        started = time.monotonic()
+        stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        try:
+            count = WRITERS[file_format](
+                stream, export_rows(types, chunk_size=options['chunk_size']), export_columns(types))
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS('Выгружено товаров: {} за {:.1f} с ({:.0f} строк/с)'.format(
+                count, elapsed, count / elapsed if elapsed else 0)))
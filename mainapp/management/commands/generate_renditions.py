@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.images import process_product_image
+from mainapp.registry import product_types
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие варианты изображений товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Обработать и товары с готовыми вариантами')
+
+    def handle(self, *args, **options):
+        total = 0
+        for product_type in product_types:
+            qs = product_type.model._base_manager.exclude(image='')
+            if not options['all']:
+                qs = qs.filter(image_hash='')
+            for pk, image_name in qs.values_list('pk', 'image').iterator():
+                process_product_image(product_type.model, pk, image_name)
+                total += 1
+        self.stdout.write(self.style.SUCCESS('Обработано изображений: {}'.format(total)))
@@ -0,0 +1,44 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp.catalog_io import READERS, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = 'Импортирует товары из CSV или JSON Lines (создает новые, обновляет существующие по slug)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или "-" для stdin')
+        parser.add_argument('--format', choices=sorted(READERS), help='По умолчанию - по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=4, help='Потоков для проверки изображений')
+        parser.add_argument('--images-dir', help='Каталог, относительно которого ищутся файлы изображений')
+        parser.add_argument('--dry-run', action='store_true', help='Проверить файл, ничего не записывая')
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Не обновлять витрину каталога и поисковый индекс для импортированных товаров')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError('Укажите --format: {}'.format(', '.join(sorted(READERS))))
+        importer = CatalogImporter(
+            batch_size=options['batch_size'], workers=options['workers'], images_dir=options['images_dir'],
+            dry_run=options['dry_run'], rebuild=not options['no_rebuild'], on_error=self.report_error)
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            stats = importer.run(READERS[file_format](stream), progress=self.report_progress)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS('Готово{}: {}'.format(' (dry run)' if options['dry_run'] else '', stats)))
+        if stats.created and not options['dry_run']:
+            self.stdout.write('Варианты изображений новых товаров: python manage.py generate_renditions')
+
+    def report_error(self, number, message):
+        self.stderr.write('Строка {}: {}'.format(number, message))
+
+    def report_progress(self, stats):
+        self.stdout.write(str(stats))
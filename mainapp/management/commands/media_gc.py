@@ -0,0 +1,71 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from mainapp.models import CatalogEntry
+from mainapp.registry import product_types
+from mainapp.storage import BLOB_DIR, product_image_storage
+
+
+def count_references():
+    references = Counter()
+    for product_type in product_types:
+        rows = product_type.model._base_manager.exclude(image='').values_list('image').annotate(models.Count('id'))
+        for name, count in rows:
+            references[name] += count
+    return references
+
+
+class Command(BaseCommand):
+    help = 'Переносит изображения товаров в хранилище по хэшу и удаляет файлы без ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dedupe', action='store_true',
+                            help='Перенести старые файлы (со случайными суффиксами) в хранилище по хэшу')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--grace', type=int, default=3600,
+                            help='Не удалять файлы моложе N секунд (загрузки в незавершенных транзакциях)')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = product_image_storage
+        if options['dedupe']:
+            self.dedupe(storage, dry_run)
+
+        references = count_references()
+        deadline = time.time() - options['grace']
+        removed = 0
+        freed = 0
+        for name, full_path in storage.blobs():
+            if references[name] or os.path.getmtime(full_path) > deadline:
+                continue
+            freed += os.path.getsize(full_path)
+            removed += 1
+            if not dry_run:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS('Файлов с ссылками: {}, удалено: {} ({} байт){}'.format(
+            len(references), removed, freed, ' (dry run)' if dry_run else '')))
+
+    def dedupe(self, storage, dry_run):
+        legacy = [name for name in count_references() if not name.startswith(BLOB_DIR + '/')]
+        moved = 0
+        for name in legacy:
+            if not storage.exists(name):
+                self.stderr.write('Файл не найден: {}'.format(name))
+                continue
+            if dry_run:
+                moved += 1
+                continue
+            with storage.open(name) as source:
+                new_name = storage.save(name, source)
+            old_url, new_url = storage.url(name), storage.url(new_name)
+            with transaction.atomic():
+                for product_type in product_types:
+                    product_type.model._base_manager.filter(image=name).update(image=new_name)
+                CatalogEntry.objects.filter(image_url=old_url).update(image_url=new_url)
+            storage.delete(name)
+            moved += 1
+        self.stdout.write('Перенесено в хранилище по хэшу: {}{}'.format(moved, ' (dry run)' if dry_run else ''))
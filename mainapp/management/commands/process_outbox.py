@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mainapp.orders import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Фоновый обработчик очереди событий (OutboxEvent)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать одну пачку и выйти')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0, help='Пауза между опросами, секунд')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_outbox(batch_size=options['batch_size'])
+            if processed:
+                self.stdout.write('Обработано событий: {}'.format(processed))
+            if options['once']:
+                break
+            if processed < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mainapp.facets import build_spec_values
+from mainapp.models import CatalogEntry, SpecValue
+from mainapp.registry import product_types
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает таблицу CatalogEntry из таблиц товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        with transaction.atomic():
+            CatalogEntry.objects.all().delete()
+            for product_type in product_types:
+                batch = []
+                qs = product_type.model._base_manager.order_by('pk')
+                for product in qs.iterator(chunk_size=batch_size):
+                    batch.append(CatalogEntry.objects.build_entry(product))
+                    if len(batch) >= batch_size:
+                        CatalogEntry.objects.bulk_create(batch)
+                        total += len(batch)
+                        batch = []
+                CatalogEntry.objects.bulk_create(batch)
+                total += len(batch)
+            # bulk_create на SQLite не возвращает id, поэтому характеристики - отдельным проходом
+            spec_values = []
+            for entry in CatalogEntry.objects.order_by('pk').iterator(chunk_size=batch_size):
+                spec_values.extend(build_spec_values(entry))
+                if len(spec_values) >= batch_size:
+                    SpecValue.objects.bulk_create(spec_values)
+                    spec_values = []
+            SpecValue.objects.bulk_create(spec_values)
+        self.stdout.write(self.style.SUCCESS('Записей в каталоге: {}'.format(total)))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mainapp.models import CatalogEntry
+from mainapp.registry import product_types
+from mainapp.search import get_document, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает поисковый индекс по товарам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        backend = get_search_backend()
+        total = 0
+        with transaction.atomic():
+            backend.clear()
+            for product_type in product_types:
+                entry_ids = dict(CatalogEntry.objects.filter(
+                    content_type_id=product_type.content_type_id).values_list('object_id', 'id'))
+                documents = []
+                qs = product_type.model._base_manager.order_by('pk')
+                for product in qs.iterator(chunk_size=batch_size):
+                    if product.pk not in entry_ids:
+                        continue
+                    documents.append((entry_ids[product.pk], get_document(product, product_type)))
+                    if len(documents) >= batch_size:
+                        backend.index_many(documents)
+                        total += len(documents)
+                        documents = []
+                backend.index_many(documents)
+                total += len(documents)
+        self.stdout.write(self.style.SUCCESS('Проиндексировано товаров: {}'.format(total)))
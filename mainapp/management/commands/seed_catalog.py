@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp.registry import product_types
+from mainapp.seeding import CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическим каталогом для нагрузочных замеров: товары с правдоподобными '
+        'характеристиками, категории, покупатели и корзины. Одинаковый --seed дает одинаковые данные, '
+        'изображение - одна заглушка на тип товара.'
+    )
+
+    def add_arguments(self, parser):
+        for product_type in product_types:
+            parser.add_argument('--{}s'.format(product_type.ct_model), type=int, default=10000,
+                                dest=product_type.ct_model, help='Сколько создать: {}'.format(
+                                    product_type.model._meta.verbose_name_plural))
+        parser.add_argument('--customers', type=int, default=1000)
+        parser.add_argument('--max-cart-items', type=int, default=4, help='Товаров в корзине покупателя, максимум')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-rebuild', action='store_true',
+                            help='Не пересобирать витрину каталога и поисковый индекс')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        counts = {product_type.ct_model: options[product_type.ct_model] for product_type in product_types}
+        seeder = CatalogSeeder(seed=options['seed'], batch_size=options['batch_size'],
+                               rebuild=not options['no_rebuild'])
+        stats = seeder.run(counts, customers=options['customers'], max_cart_items=options['max_cart_items'],
+                           progress=self.report_progress)
+        self.stdout.write(self.style.SUCCESS('Готово: {}'.format(stats)))
+        if options['no_rebuild']:
+            self.stdout.write('Витрина и поиск: python manage.py rebuild_catalog && '
+                              'python manage.py rebuild_search_index')
+
+    def report_progress(self, stats):
+        self.stdout.write(str(stats))
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+from . import instrumentation
+from .cart import AnonymousCart
+from .pagecache import PageCache, is_cacheable_request, is_cacheable_response
+
+
+# MiddlewareMixin работает и в синхронном, и в асинхронном стеке: под ASGI
+# асинхронные вью (async_views.py) не переводятся обратно в поток
+
+instrumentation_logger = logging.getLogger('mainapp.instrumentation')
+
+
+class AnonymousCartMiddleware(MiddlewareMixin):
+
+    def process_request(self, request):
+        request.anonymous_cart = AnonymousCart.from_request(request)
+
+    def process_response(self, request, response):
+        anonymous_cart = getattr(request, 'anonymous_cart', None)
+        if anonymous_cart is not None:
+            anonymous_cart.save(response)
+        return response
+
+
+class PageCacheMiddleware(MiddlewareMixin):
+    """
+    Отдает страницы анонимным посетителям из PageCache. Ставится после
+    AuthenticationMiddleware и CsrfViewMiddleware.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.page_cache = PageCache(getattr(settings, 'PAGE_CACHE_TIMEOUT', 600))
+        self.enabled = getattr(settings, 'PAGE_CACHE_ENABLED', True)
+
+    def process_request(self, request):
+        if not self.enabled or not is_cacheable_request(request):
+            return None
+        entry = self.page_cache.get(request)
+        if entry is not None:
+            response = self.page_cache.build_response(request, entry)
+            response['X-Page-Cache'] = 'hit'
+            return response
+        request.page_cache_started = time.time()
+        return None
+
+    def process_response(self, request, response):
+        started = getattr(request, 'page_cache_started', None)
+        if started is not None and is_cacheable_response(request, response):
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            self.page_cache.set(request, response, started)
+            response['X-Page-Cache'] = 'miss'
+        return response
+
+
+class InstrumentationMiddleware(MiddlewareMixin):
+    """
+    Для доли запросов INSTRUMENTATION_SAMPLE_RATE собирает метрики
+    (instrumentation.RequestMetrics): пишет заголовок Server-Timing, строку
+    в лог mainapp.instrumentation и добавляет запрос в гистограмму
+    (страница admin/metrics/). Ставится первым после SecurityMiddleware.
+    """
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0)
+        self.server_timing = getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True)
+        if self.sample_rate > 0:
+            instrumentation.histogram.window = getattr(settings, 'INSTRUMENTATION_WINDOW', 1000)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation.current_metrics.set(metrics)
+        try:
+            with instrumentation.track():
+                response = self.get_response(request)
+        finally:
+            instrumentation.current_metrics.reset(token)
+        return self.record(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        metrics = instrumentation.RequestMetrics()
+        # sync_to_async копирует контекст, запросы из потоков попадут в те же метрики
+        # (в потоках их учитывает instrumentation.tracked, см. async_views.py)
+        token = instrumentation.current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.current_metrics.reset(token)
+        return self.record(request, response, metrics)
+
+    @staticmethod
+    def view_name(request, response):
+        if response.get('X-Page-Cache') == 'hit':
+            return 'page_cache'
+        match = request.resolver_match
+        return match.view_name if match is not None else 'unresolved'
+
+    def record(self, request, response, metrics):
+        metrics.finish()
+        name = self.view_name(request, response)
+        instrumentation.histogram.add(name, metrics)
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing()
+        if instrumentation_logger.isEnabledFor(logging.INFO):
+            data = {
+                'method': request.method,
+                'path': request.path,
+                'view': name,
+                'status': response.status_code,
+                **metrics.as_dict(),
+            }
+            instrumentation_logger.info(json.dumps(data, ensure_ascii=False), extra={'metrics': data})
+        return response
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0007_auto_20210218_1137'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notebook',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now,
+                                       verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='smartphone',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now,
+                                       verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+    ]
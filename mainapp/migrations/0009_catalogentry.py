@@ -0,0 +1,50 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('mainapp', '0008_product_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=255, verbose_name='Название продукта')),
+                ('slug', models.SlugField(blank=True, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='Цена')),
+                ('image_url', models.CharField(blank=True, max_length=255, verbose_name='Изоброжение')),
+                ('specs', models.JSONField(default=dict, verbose_name='Характеристики')),
+                ('created_at', models.DateTimeField(verbose_name='Дата добавления')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainapp.category', verbose_name='Катекория')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name': 'Запись каталога',
+                'verbose_name_plural': 'Каталог',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['category', 'price'], name='catalog_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['price'], name='catalog_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['-created_at'], name='catalog_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogentry',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_catalog_entry'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0009_catalogentry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='catalogentry',
+            name='catalog_category_price_idx',
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['category', 'price', 'id'], name='catalog_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['category', '-id'], name='catalog_category_id_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0010_catalogentry_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpecValue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=64)),
+                ('value', models.CharField(max_length=255)),
+                ('number', models.FloatField(blank=True, null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mainapp.category')),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spec_values', to='mainapp.catalogentry')),
+            ],
+            options={
+                'verbose_name': 'Значение характеристики',
+                'verbose_name_plural': 'Значения характеристик',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='specvalue',
+            index=models.Index(fields=['category', 'field', 'value'], name='spec_category_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='specvalue',
+            index=models.Index(fields=['field', 'value', 'entry'], name='spec_value_entry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='specvalue',
+            index=models.Index(fields=['field', 'number', 'entry'], name='spec_number_entry_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+SQLITE_FORWARD = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS mainapp_search_index USING fts5(
+    entry_id UNINDEXED, title UNINDEXED, title_stems, body_stems,
+    prefix='2 3', tokenize='unicode61 remove_diacritics 0'
+)
+'''
+
+POSTGRES_FORWARD = [
+    '''
+    CREATE TABLE IF NOT EXISTS mainapp_search_index (
+        entry_id integer PRIMARY KEY REFERENCES mainapp_catalogentry (id) ON DELETE CASCADE,
+        title varchar(255) NOT NULL,
+        document tsvector NOT NULL
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS mainapp_search_index_document ON mainapp_search_index USING GIN (document)',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        for sql in POSTGRES_FORWARD:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute('DROP TABLE IF EXISTS mainapp_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0011_specvalue'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0013_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notebook',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='smartphone',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:55
+
+from django.db import migrations, models
+import mainapp.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0014_product_image_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notebook',
+            name='image',
+            field=models.ImageField(storage=mainapp.storage.ContentAddressedStorage(), upload_to='', verbose_name='Изоброжение'),
+        ),
+        migrations.AlterField(
+            model_name='smartphone',
+            name='image',
+            field=models.ImageField(storage=mainapp.storage.ContentAddressedStorage(), upload_to='', verbose_name='Изоброжение'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:56
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    # Без уникальности могли появиться несколько открытых корзин покупателя
+    # и несколько строк одного товара в корзине: сливаем их до ограничений
+    Cart = apps.get_model('mainapp', 'Cart')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    db_alias = schema_editor.connection.alias
+    carts = Cart.objects.using(db_alias)
+    lines = CartProduct.objects.using(db_alias)
+    touched = set()
+    duplicate_carts = carts.filter(in_order=False).values('owner_id').annotate(
+        keep=Min('pk'), count=Count('pk')).filter(count__gt=1)
+    for row in duplicate_carts:
+        others = carts.filter(owner_id=row['owner_id'], in_order=False).exclude(pk=row['keep'])
+        lines.filter(cart__in=others).update(cart_id=row['keep'])
+        others.delete()
+        touched.add(row['keep'])
+    duplicate_lines = lines.values('cart_id', 'content_type_id', 'object_id').annotate(
+        keep=Min('pk'), count=Count('pk'), qtr_sum=Sum('qtr'), price_sum=Sum('final_price')).filter(count__gt=1)
+    for row in duplicate_lines:
+        same = lines.filter(cart_id=row['cart_id'], content_type_id=row['content_type_id'], object_id=row['object_id'])
+        same.exclude(pk=row['keep']).delete()
+        same.filter(pk=row['keep']).update(qtr=row['qtr_sum'], final_price=row['price_sum'])
+        touched.add(row['cart_id'])
+    for cart_id in touched:
+        totals = lines.filter(cart_id=cart_id).aggregate(qty=Sum('qtr'), price=Sum('final_price'))
+        carts.filter(pk=cart_id).update(total_products=totals['qty'] or 0, final_price=totals['price'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0015_product_image_storage'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='cart',
+            name='products',
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='final_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=9, verbose_name='Общая цена'),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(in_order=False), fields=('owner',), name='unique_open_cart_per_owner'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartproduct',
+            constraint=models.UniqueConstraint(fields=('cart', 'content_type', 'object_id'), name='unique_cart_product'),
+        ),
+    ]
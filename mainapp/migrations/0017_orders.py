@@ -0,0 +1,71 @@
+# Generated by Django 3.1.14 on 2026-10-18 18:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0016_cart_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20, verbose_name='Номер телефона')),
+                ('address', models.CharField(max_length=255, verbose_name='Адресс')),
+                ('status', models.CharField(choices=[('new', 'Новый заказ'), ('in_progress', 'Заказ в обработке'), ('completed', 'Заказ выполнен'), ('canceled', 'Заказ отменен')], default='new', max_length=20, verbose_name='Статус')),
+                ('total_products', models.PositiveIntegerField(default=0)),
+                ('final_price', models.DecimalField(decimal_places=2, max_digits=9, verbose_name='Общая цена')),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Заказ',
+                'verbose_name_plural': 'Заказы',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Событие',
+                'verbose_name_plural': 'Очередь событий',
+            },
+        ),
+        migrations.AddField(
+            model_name='notebook',
+            name='stock',
+            field=models.PositiveIntegerField(default=0, verbose_name='Остаток на складе'),
+        ),
+        migrations.AddField(
+            model_name='smartphone',
+            name='stock',
+            field=models.PositiveIntegerField(default=0, verbose_name='Остаток на складе'),
+        ),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['processed_at', 'id'], name='outbox_pending_idx'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='cart',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, to='mainapp.cart', verbose_name='Корзина'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to='mainapp.customer', verbose_name='Покупатель'),
+        ),
+    ]
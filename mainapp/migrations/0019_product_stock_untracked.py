@@ -0,0 +1,38 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+PRODUCT_MODELS = ('notebook', 'smartphone')
+
+
+def untrack_default_stock(apps, schema_editor):
+    # 0017 проставил всем товарам остаток 0, и их нельзя было заказать.
+    # Реальные остатки заводятся после миграции, до тех пор учет выключен
+    for model_name in PRODUCT_MODELS:
+        apps.get_model('mainapp', model_name)._base_manager.filter(stock=0).update(stock=None)
+
+
+def track_stock(apps, schema_editor):
+    for model_name in PRODUCT_MODELS:
+        apps.get_model('mainapp', model_name)._base_manager.filter(stock__isnull=True).update(stock=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0018_category_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notebook',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Остаток на складе'),
+        ),
+        migrations.AlterField(
+            model_name='smartphone',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Остаток на складе'),
+        ),
+        migrations.RunPython(untrack_default_stock, track_stock),
+    ]
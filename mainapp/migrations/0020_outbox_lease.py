@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0019_product_stock_untracked'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxevent',
+            name='lock_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
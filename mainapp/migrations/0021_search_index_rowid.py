@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# entry_id был UNINDEXED-колонкой FTS5: удаление по нему сканировало всю
+# таблицу. Теперь id записи каталога хранится в rowid.
+SQLITE_FORWARD = [
+    '''
+    CREATE VIRTUAL TABLE mainapp_search_index_new USING fts5(
+        title UNINDEXED, title_stems, body_stems,
+        prefix='2 3', tokenize='unicode61 remove_diacritics 0'
+    )
+    ''',
+    '''
+    INSERT INTO mainapp_search_index_new (rowid, title, title_stems, body_stems)
+    SELECT CAST(entry_id AS INTEGER), title, title_stems, body_stems FROM mainapp_search_index
+    ''',
+    'DROP TABLE mainapp_search_index',
+    'ALTER TABLE mainapp_search_index_new RENAME TO mainapp_search_index',
+]
+
+SQLITE_BACKWARD = [
+    '''
+    CREATE VIRTUAL TABLE mainapp_search_index_old USING fts5(
+        entry_id UNINDEXED, title UNINDEXED, title_stems, body_stems,
+        prefix='2 3', tokenize='unicode61 remove_diacritics 0'
+    )
+    ''',
+    '''
+    INSERT INTO mainapp_search_index_old (entry_id, title, title_stems, body_stems)
+    SELECT rowid, title, title_stems, body_stems FROM mainapp_search_index
+    ''',
+    'DROP TABLE mainapp_search_index',
+    'ALTER TABLE mainapp_search_index_old RENAME TO mainapp_search_index',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for sql in statements:
+                schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0020_outbox_lease'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(SQLITE_FORWARD), run(SQLITE_BACKWARD)),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+from mainapp.facets import normalize_spec_value
+from mainapp.search import get_search_backend, tokenize
+
+# Характеристики на момент миграции (Product.SPECIFICATION)
+SPEC_FIELDS = {
+    'notebook': ('diagonal', 'display_type', 'processor_freg', 'ram', 'video', 'time_without_charge'),
+    'smartphone': ('diagonal', 'display_type', 'resolution', 'ram', 'sd', 'sd_vol_max', 'accum_volue',
+                   'main_cam_up', 'frontal_cam_up'),
+}
+BATCH_SIZE = 1000
+
+
+def fill_catalog_entries(apps, schema_editor):
+    # 0009 создал пустую витрину: у базы с товарами пустели главная, категории и поиск
+    CatalogEntry = apps.get_model('mainapp', 'CatalogEntry')
+    SpecValue = apps.get_model('mainapp', 'SpecValue')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    db_alias = schema_editor.connection.alias
+    if CatalogEntry.objects.using(db_alias).exists():
+        return
+    backend = get_search_backend()
+    for model_name, spec_fields in SPEC_FIELDS.items():
+        model = apps.get_model('mainapp', model_name)
+        products = model._base_manager.using(db_alias).order_by('pk')
+        if not products.exists():
+            continue
+        content_type, _ = ContentType.objects.using(db_alias).get_or_create(app_label='mainapp', model=model_name)
+        for start in range(0, products.count(), BATCH_SIZE):
+            batch = list(products[start:start + BATCH_SIZE])
+            CatalogEntry.objects.using(db_alias).bulk_create([
+                CatalogEntry(
+                    content_type_id=content_type.pk, object_id=product.pk, category_id=product.category_id,
+                    title=product.title, slug=product.slug, price=product.price,
+                    image_url=product.image.url if product.image else '',
+                    specs={field: getattr(product, field) for field in spec_fields},
+                    created_at=product.created_at,
+                ) for product in batch
+            ])
+            entries = CatalogEntry.objects.using(db_alias).filter(
+                content_type_id=content_type.pk, object_id__in=[product.pk for product in batch])
+            entry_ids = {}
+            spec_values = []
+            for entry in entries:
+                entry_ids[entry.object_id] = entry.pk
+                for field, value in entry.specs.items():
+                    normalized = normalize_spec_value(value)
+                    if normalized is not None:
+                        spec_values.append(SpecValue(
+                            entry_id=entry.pk, category_id=entry.category_id, field=field,
+                            value=normalized[0], number=normalized[1]))
+            SpecValue.objects.using(db_alias).bulk_create(spec_values)
+            backend.index_many([(entry_ids[product.pk], {
+                'title': product.title,
+                'title_stems': ' '.join(tokenize(product.title)),
+                'body_stems': ' '.join(tokenize(product.description) + tokenize(
+                    ' '.join(str(getattr(product, field) or '') for field in spec_fields))),
+            }) for product in batch])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('mainapp', '0021_search_index_rowid'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_catalog_entries, migrations.RunPython.noop),
+    ]
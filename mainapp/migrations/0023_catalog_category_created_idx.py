@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0022_fill_catalog_entries'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='catalogentry',
+            name='catalog_category_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='catalog_category_created_idx'),
+        ),
+    ]
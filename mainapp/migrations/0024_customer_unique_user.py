@@ -0,0 +1,59 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:50
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Sum
+
+
+def merge_customers(apps, schema_editor):
+    # get_customer без уникальности мог создать двух покупателей одному
+    # пользователю: корзины и заказы переносим на первого, остальных удаляем
+    Customer = apps.get_model('mainapp', 'Customer')
+    Cart = apps.get_model('mainapp', 'Cart')
+    CartProduct = apps.get_model('mainapp', 'CartProduct')
+    Order = apps.get_model('mainapp', 'Order')
+    db_alias = schema_editor.connection.alias
+    customers = Customer.objects.using(db_alias)
+    carts = Cart.objects.using(db_alias)
+    duplicates = customers.values('user_id').annotate(keep=Min('pk'), count=Count('pk')).filter(count__gt=1)
+    for row in duplicates:
+        keep = customers.get(pk=row['keep'])
+        for other in customers.filter(user_id=row['user_id']).exclude(pk=keep.pk).order_by('pk'):
+            keep.phone = keep.phone or other.phone
+            keep.address = keep.address or other.address
+            # Открытая корзина у покупателя одна (unique_open_cart_per_owner)
+            target = carts.filter(owner=keep, in_order=False).first()
+            source = carts.filter(owner=other, in_order=False).first()
+            if target is not None and source is not None:
+                move_cart_lines(carts, CartProduct.objects.using(db_alias), source, target)
+                carts.filter(pk=source.pk).delete()
+            carts.filter(owner=other).update(owner=keep)
+            CartProduct.objects.using(db_alias).filter(user=other).update(user=keep)
+            Order.objects.using(db_alias).filter(customer=other).update(customer=keep)
+            other.delete()
+        keep.save(update_fields=['phone', 'address'])
+
+
+def move_cart_lines(carts, lines, source, target):
+    for line in lines.filter(cart=source):
+        existing = lines.filter(cart=target, content_type_id=line.content_type_id, object_id=line.object_id)
+        if existing.update(qtr=F('qtr') + line.qtr, final_price=F('final_price') + line.final_price):
+            line.delete()
+        else:
+            lines.filter(pk=line.pk).update(cart=target)
+    totals = lines.filter(cart=target).aggregate(qty=Sum('qtr'), price=Sum('final_price'))
+    carts.filter(pk=target.pk).update(total_products=totals['qty'] or 0, final_price=totals['price'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0023_catalog_category_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_customers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_customer_user'),
+        ),
+    ]
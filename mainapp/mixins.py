@@ -1,5 +1,11 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.views.generic.detail import SingleObjectMixin
 
+from .cache import sidebar_counts
 from .models import Category
 
 
@@ -9,3 +15,61 @@ class CategoryDetailsMixin(SingleObjectMixin):
         context = super().get_context_data(**kwargs)
         context['categories'] = Category.object.get_categories_for_left_sidebar()
         return context
+
+
+class ConditionalDetailMixin(SingleObjectMixin):
+    """
+    ETag и Last-Modified для DetailView. ETag собирается из версии объекта
+    (get_version_parts), версии счетчиков сайдбара, пользователя (шапка
+    зависит от входа) и cookie CSRF (в странице есть формы с токеном). Если
+    клиент прислал совпадающий If-None-Match или If-Modified-Since, отвечаем
+    304 без рендера шаблона.
+    """
+
+    def get_version_parts(self):
+        return [self.object.pk, self.object.updated_at.isoformat()]
+
+    def get_etag(self):
+        parts = [
+            self.object._meta.label_lower,
+            *self.get_version_parts(),
+            sidebar_counts.version(),
+            self.request.user.pk or '',
+            self.request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        ]
+        return quote_etag(hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest())
+
+    def get_last_modified(self):
+        # Сайдбар тоже часть страницы: новый товар в другой категории меняет его счетчики
+        last_modified = max(int(self.object.updated_at.timestamp()), sidebar_counts.last_modified())
+        user = self.request.user
+        if user.is_authenticated and user.last_login:
+            # Страница гостя, закэшированная до входа, устарела
+            last_modified = max(last_modified, int(user.last_login.timestamp()))
+        return last_modified
+
+    def patch_cache_headers(self, response):
+        if self.request.user.is_authenticated:
+            patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=getattr(settings, 'HTTP_CACHE_MAX_AGE', 0),
+                s_maxage=getattr(settings, 'HTTP_CACHE_SHARED_MAX_AGE', 60), must_revalidate=True)
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return self.respond()
+
+    def respond(self):
+        etag = self.get_etag()
+        last_modified = self.get_last_modified()
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.render_to_response(self.get_context_data(object=self.object))
+        response['ETag'] = etag
+        # Вошедшему только ETag: иначе после выхода If-Modified-Since со временем
+        # входа совпал бы со страницей гостя, и браузер показал бы шапку с "Выйти"
+        if not self.request.user.is_authenticated:
+            response['Last-Modified'] = http_date(last_modified)
+        self.patch_cache_headers(response)
+        return response
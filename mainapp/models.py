@@ -1,21 +1,19 @@
-import sys
-from PIL import Image
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
-from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.urls import reverse
 
-from io import BytesIO
+from .cache import sidebar_counts
+from .facets import build_spec_values
+from .feed import get_feed
+from .images import get_dimensions
+from .registry import product_types
+from .storage import product_image_storage
 
 User = get_user_model()
 
 
-def get_models_for_count(*model_names):
-    return [models.Count(model_name) for model_name in model_names]
-
-
 def get_product_url(obj, viewname):
     ct_model = obj.__class__._meta.model_name
     return reverse(viewname, kwargs={'ct_model': ct_model, 'slug': obj.slug})
@@ -33,40 +31,39 @@ class LatestProductsManager:
     @staticmethod
     def get_products_for_main_page(*args, **kwargs):
         with_respect_to = kwargs.get('with_respect_to')
-        products = []
-        ct_models = ContentType.objects.filter(model__in=args)
-        for ct_model in ct_models:
-            model_products = ct_model.model_class()._base_manager.all().order_by('-id')[:5]
-            products.extend(model_products)
-        if with_respect_to:
-            ct_model = ContentType.objects.filter(model=with_respect_to)
-            if ct_model.exists():
-                if with_respect_to in args:
-                    return sorted(products, key=lambda x: x.__class__._meta.model_name.startswith(with_respect_to),
-                                  reverse=True)
-
+        count = kwargs.get('count', 5 * len(args or product_types))
+        products = get_feed(args, count=count, cursor=kwargs.get('cursor')).products
+        if with_respect_to and with_respect_to in args and with_respect_to in product_types:
+            return sorted(products, key=lambda x: x.__class__._meta.model_name.startswith(with_respect_to),
+                          reverse=True)
         return products
 
+    @staticmethod
+    def get_feed(*args, count=15, cursor=None):
+        return get_feed(args, count=count, cursor=cursor)
+
 
 class LatestProducts:
     objects = LatestProductsManager()
 
 
 class CategoryManager(models.Manager):
-    CATEGORY_NAME_COUNT_NAME = {
-        'Ноутбуки': 'notebook__count',
-        'Смартфоны': 'smartphone__count'
-    }
 
     def get_queryset(self):
         return super().get_queryset()
 
     def get_categories_for_left_sidebar(self):
-        models = get_models_for_count('notebook', 'smartphone')
-        qs = list(self.get_queryset().annotate(*models))
+        return sidebar_counts.get(self.count_categories_for_left_sidebar)
+
+    def count_categories_for_left_sidebar(self):
+        counts = {}
+        for product_type in product_types:
+            rows = product_type.model._base_manager.values_list('category_id').annotate(models.Count('id'))
+            for category_id, count in rows:
+                counts[category_id] = counts.get(category_id, 0) + count
         date = [
-            dict(name=c.name, url=c.get_absolute_url(), count=getattr(c, self.CATEGORY_NAME_COUNT_NAME[c.name]))
-            for c in qs
+            dict(id=c.id, name=c.name, url=c.get_absolute_url(), count=counts.get(c.id, 0))
+            for c in self.get_queryset()
         ]
         return date
 
@@ -74,6 +71,8 @@ class CategoryManager(models.Manager):
 class Category(models.Model):
     name = models.CharField(max_length=255, verbose_name='Название категории')
     slug = models.SlugField(unique=True)
+    # Меняется и при изменении товаров категории (signals.touch_product_category)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
     object = CategoryManager()
 
     def __str__(self):
@@ -98,44 +97,53 @@ class Product(models.Model):
     category = models.ForeignKey(Category, verbose_name='Катекория', on_delete=models.CASCADE)
     title = models.CharField(max_length=255, verbose_name='Название продукта')
     slug = models.SlugField(unique=True, null=True, blank=True)
-    image = models.ImageField(verbose_name='Изоброжение')
+    image = models.ImageField(verbose_name='Изоброжение', storage=product_image_storage)
+    image_hash = models.CharField(max_length=40, blank=True, editable=False)
     description = models.TextField(verbose_name='Описание', null=True, blank=True)
     price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата добавления')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
+    # NULL - остаток не учитывается, товар можно заказывать без ограничений
+    stock = models.PositiveIntegerField(null=True, blank=True, verbose_name='Остаток на складе')
 
     # url = models.SlugField(max_length=160, unique=True)
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
-        # -----------------------Вставляем изоброжение с ограничением-----------------
-        image = self.image
-        img = Image.open(image)
-        min_width, min_height = self.MIN_RESOLUTION
-        max_width, max_height = self.MAX_RESOLUTION
-        if img.width < min_width or img.height < min_height:
+    def get_ct_model(self):
+        return self._meta.model_name
+
+    @classmethod
+    def check_resolution(cls, width, height):
+        min_width, min_height = cls.MIN_RESOLUTION
+        max_width, max_height = cls.MAX_RESOLUTION
+        if width < min_width or height < min_height:
             raise MinResolutionErrorException('Разрешение изоброжение меньше минимального')
-        if img.width > max_width or img.height > max_height:
+        if width > max_width or height > max_height:
             raise MaxResolutionErrorException('Разрешение изоброжение больше максимального')
-        super().save(*args, **kwargs)
 
-        # -----------------------Обрезаем изоброжение-------------------
-
-        # image = self.image
-        # img = Image.open(image)
-        # new_img = img.convert('RGB')
-        # resized_new_img = new_img.resize((200, 200), Image.ANTIALIAS)
-        # filestriam = BytesIO()
-        # resized_new_img.save(filestriam, 'JPEG', quality=90)
-        # filestriam.seek(0)
-        # name = '{}.{}'.format(*self.image.name.split('.'))
-        # self.image = InMemoryUploadedFile(
-        #     filestriam, 'ImageField', name, 'jpeg/image', sys.getsizeof(filestriam), None
-        # )
-        # super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        # -----------------------Вставляем изоброжение с ограничением-----------------
+        # Проверяем только новый файл и только по заголовку, без декодирования
+        if self.image and not self.image._committed:
+            self.image_hash = ''
+            self.check_resolution(*get_dimensions(self.image))
+        # post_save (и обновление CatalogEntry) выполняется в той же транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
 
 class Notebook(Product):
+    SPECIFICATION = {
+        'Диагональ': 'diagonal',
+        'Тип дисплея': 'display_type',
+        'Частота процессора': 'processor_freg',
+        'Память': 'ram',
+        'Видео память': 'video',
+        'Время работы аккумулятора': 'time_without_charge',
+    }
+
     diagonal = models.CharField(max_length=5, verbose_name='Диагональ')
     display_type = models.CharField(max_length=255, verbose_name='Тип дисплея')
     processor_freg = models.CharField(max_length=255, verbose_name='Частота процессора')
@@ -155,6 +163,18 @@ class Notebook(Product):
 
 
 class Smartphone(Product):
+    SPECIFICATION = {
+        'Диагональ': 'diagonal',
+        'Тип дисплея': 'display_type',
+        'Разрешение экрана': 'resolution',
+        'Память': 'ram',
+        'cd карта': 'sd',
+        'Макс.обьем встроенной памяти': 'sd_vol_max',
+        'Обьем батареи': 'accum_volue',
+        'Главная камера': 'main_cam_up',
+        'Фронтальная камера': 'frontal_cam_up',
+    }
+
     diagonal = models.CharField(max_length=5, verbose_name='Диагональ')
     display_type = models.CharField(max_length=255, verbose_name='Тип дисплея')
     resolution = models.CharField(max_length=255, verbose_name='Разрешение экрана')
@@ -177,6 +197,141 @@ class Smartphone(Product):
         verbose_name_plural = 'Смартфоны'
 
 
+class CatalogEntryManager(models.Manager):
+
+    @staticmethod
+    def build_entry(product):
+        product_type = product_types.for_model(product.__class__)
+        return CatalogEntry(
+            content_type_id=product_type.content_type_id,
+            object_id=product.pk,
+            category_id=product.category_id,
+            title=product.title,
+            slug=product.slug,
+            price=product.price,
+            image_url=product.image.url if product.image else '',
+            specs={field: getattr(product, field) for field in product_type.spec_fields},
+            created_at=product.created_at,
+        )
+
+    def sync(self, product):
+        entry = self.build_entry(product)
+        values = {field: getattr(entry, field) for field in CatalogEntry.SYNC_FIELDS}
+        entry, _ = self.update_or_create(
+            content_type_id=entry.content_type_id, object_id=entry.object_id, defaults=values)
+        SpecValue.objects.filter(entry=entry).delete()
+        SpecValue.objects.bulk_create(build_spec_values(entry))
+        return entry
+
+    def sync_many(self, product_type, products):
+        """
+        sync() пачкой для товаров одного типа. Возвращает {id товара: id записи}.
+        """
+        built = {product.pk: self.build_entry(product) for product in products}
+        if not built:
+            return {}
+        # Существующие записи читаются из базы, в которую идет запись: реплика может отставать
+        entries = self.using(router.db_for_write(self.model)).filter(
+            content_type_id=product_type.content_type_id, object_id__in=list(built))
+        existing = {entry.object_id: entry for entry in entries}
+        new, changed = [], []
+        for object_id, entry in built.items():
+            current = existing.get(object_id)
+            if current is None:
+                new.append(entry)
+                continue
+            for field in CatalogEntry.SYNC_FIELDS:
+                setattr(current, field, getattr(entry, field))
+            changed.append(current)
+        self.bulk_create(new)
+        if changed:
+            fields = ['category' if field == 'category_id' else field for field in CatalogEntry.SYNC_FIELDS]
+            self.bulk_update(changed, fields)
+        # bulk_create на SQLite не возвращает id
+        entry_ids = dict(entries.values_list('object_id', 'id'))
+        SpecValue.objects.filter(entry_id__in=list(entry_ids.values())).delete()
+        spec_values = []
+        for object_id, entry in built.items():
+            entry.id = entry_ids[object_id]
+            spec_values.extend(build_spec_values(entry))
+        SpecValue.objects.bulk_create(spec_values)
+        return entry_ids
+
+    def remove(self, product):
+        content_type_id = product_types.for_model(product.__class__).content_type_id
+        entries = self.using(router.db_for_write(self.model)).filter(
+            content_type_id=content_type_id, object_id=product.pk)
+        entry_ids = list(entries.values_list('id', flat=True))
+        entries.delete()
+        return entry_ids
+
+
+class CatalogEntry(models.Model):
+    SYNC_FIELDS = ('category_id', 'title', 'slug', 'price', 'image_url', 'specs', 'created_at')
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey('content_type', 'object_id')
+    category = models.ForeignKey(Category, verbose_name='Катекория', on_delete=models.CASCADE)
+    title = models.CharField(max_length=255, verbose_name='Название продукта')
+    slug = models.SlugField(null=True, blank=True)
+    price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена')
+    image_url = models.CharField(max_length=255, blank=True, verbose_name='Изоброжение')
+    specs = models.JSONField(default=dict, verbose_name='Характеристики')
+    created_at = models.DateTimeField(verbose_name='Дата добавления')
+    objects = CatalogEntryManager()
+
+    def __str__(self):
+        return self.title
+
+    def get_absolute_url(self):
+        return reverse('product_detail', kwargs={'ct_model': self.ct_model, 'slug': self.slug})
+
+    @property
+    def ct_model(self):
+        return product_types.for_content_type_id(self.content_type_id).ct_model
+
+    class Meta:
+        verbose_name = 'Запись каталога'
+        verbose_name_plural = 'Каталог'
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='unique_catalog_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'price', 'id'], name='catalog_category_price_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='catalog_category_created_idx'),
+            models.Index(fields=['price'], name='catalog_price_idx'),
+            models.Index(fields=['-created_at'], name='catalog_created_idx'),
+        ]
+
+
+class SpecValue(models.Model):
+    entry = models.ForeignKey(CatalogEntry, on_delete=models.CASCADE, related_name='spec_values')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    field = models.CharField(max_length=64)
+    value = models.CharField(max_length=255)
+    number = models.FloatField(null=True, blank=True)
+
+    def __str__(self):
+        return '{}: {}'.format(self.field, self.value)
+
+    class Meta:
+        verbose_name = 'Значение характеристики'
+        verbose_name_plural = 'Значения характеристик'
+        indexes = [
+            models.Index(fields=['category', 'field', 'value'], name='spec_category_value_idx'),
+            models.Index(fields=['field', 'value', 'entry'], name='spec_value_entry_idx'),
+            models.Index(fields=['field', 'number', 'entry'], name='spec_number_entry_idx'),
+        ]
+
+
+class CartProductQuerySet(models.QuerySet):
+
+    def with_products(self):
+        # GenericForeignKey группирует строки по content_type и грузит каждый тип одним IN-запросом
+        return self.prefetch_related('content_object')
+
+
 class CartProduct(models.Model):
     user = models.ForeignKey("Customer", verbose_name='Покупатель', on_delete=models.CASCADE)
     cart = models.ForeignKey('Cart', verbose_name='Корзина', on_delete=models.CASCADE, related_name='related_product')
@@ -185,6 +340,7 @@ class CartProduct(models.Model):
     content_object = GenericForeignKey('content_type', 'object_id')
     qtr = models.PositiveIntegerField(default=1)
     final_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Общая цена')
+    objects = CartProductQuerySet.as_manager()
 
     def __str__(self):
         return "Продукт: {} (для корзины)".format(self.content_object.title)
@@ -192,13 +348,15 @@ class CartProduct(models.Model):
     class Meta:
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'content_type', 'object_id'], name='unique_cart_product'),
+        ]
 
 
 class Cart(models.Model):
     owner = models.ForeignKey('Customer', verbose_name='Владелец', on_delete=models.CASCADE)
-    products = models.ManyToManyField(CartProduct, blank=True, related_name='cart_product')
     total_products = models.PositiveIntegerField(default=0)
-    final_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Общая цена')
+    final_price = models.DecimalField(max_digits=9, decimal_places=2, default=0, verbose_name='Общая цена')
     in_order = models.BooleanField(default=False)
     for_anonymous_user = models.BooleanField(default=False)
 
@@ -208,6 +366,63 @@ class Cart(models.Model):
     class Meta:
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзина'
+        constraints = [
+            models.UniqueConstraint(fields=['owner'], condition=models.Q(in_order=False),
+                                    name='unique_open_cart_per_owner'),
+        ]
+
+
+class Order(models.Model):
+    STATUS_NEW = 'new'
+    STATUS_IN_PROGRESS = 'in_progress'
+    STATUS_COMPLETED = 'completed'
+    STATUS_CANCELED = 'canceled'
+    STATUS_CHOICES = (
+        (STATUS_NEW, 'Новый заказ'),
+        (STATUS_IN_PROGRESS, 'Заказ в обработке'),
+        (STATUS_COMPLETED, 'Заказ выполнен'),
+        (STATUS_CANCELED, 'Заказ отменен'),
+    )
+
+    customer = models.ForeignKey('Customer', verbose_name='Покупатель', on_delete=models.CASCADE,
+                                 related_name='orders')
+    cart = models.OneToOneField(Cart, verbose_name='Корзина', on_delete=models.PROTECT)
+    phone = models.CharField(max_length=20, verbose_name='Номер телефона')
+    address = models.CharField(max_length=255, verbose_name='Адресс')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_NEW, verbose_name='Статус')
+    total_products = models.PositiveIntegerField(default=0)
+    final_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Общая цена')
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    def __str__(self):
+        return str(self.id)
+
+    class Meta:
+        verbose_name = 'Заказ'
+        verbose_name_plural = 'Заказы'
+
+
+class OutboxEvent(models.Model):
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Аренда события обработчиком (orders.claim_events)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    lock_token = models.CharField(max_length=32, blank=True)
+
+    def __str__(self):
+        return '{} #{}'.format(self.topic, self.id)
+
+    class Meta:
+        verbose_name = 'Событие'
+        verbose_name_plural = 'Очередь событий'
+        indexes = [
+            models.Index(fields=['processed_at', 'id'], name='outbox_pending_idx'),
+        ]
 
 
 class Customer(models.Model):
@@ -221,6 +436,9 @@ class Customer(models.Model):
     class Meta:
         verbose_name = 'Покупатель'
         verbose_name_plural = 'Покупатель'
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='unique_customer_user'),
+        ]
 
 # class Reviews(models.Model):
 #     email = models.EmailField()
@@ -0,0 +1,193 @@
+import logging
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Cart, CartProduct, Order, OutboxEvent
+from .registry import product_types
+
+logger = logging.getLogger(__name__)
+
+ORDER_PLACED = 'order_placed'
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class EmptyCartError(CheckoutError):
+    pass
+
+
+class ProductUnavailableError(CheckoutError):
+    pass
+
+
+class OutOfStockError(CheckoutError):
+
+    def __init__(self, product):
+        super().__init__('Недостаточно товара на складе: {}'.format(product))
+        self.product = product
+
+
+def reserve_stock(lines):
+    """
+    Списывает остатки по строкам корзины. Строки товаров блокируются
+    SELECT ... FOR UPDATE в порядке (тип, id), чтобы параллельные заказы не
+    ловили взаимоблокировки. На SQLite FOR UPDATE не поддерживается, там
+    гарантию дает условный UPDATE ... WHERE stock >= qty. Остаток NULL
+    не учитывается и не списывается.
+
+    Возвращает заблокированные товары: {(content_type_id, id): товар}.
+    """
+    locked = {}
+    by_type = {}
+    for line in lines:
+        by_type.setdefault(line.content_type_id, {})[line.object_id] = line.qtr
+    for content_type_id in sorted(by_type):
+        model = product_types.for_content_type_id(content_type_id).model
+        quantities = by_type[content_type_id]
+        qs = model._base_manager.filter(pk__in=quantities).order_by('pk')
+        if connection.features.has_select_for_update:
+            qs = qs.select_for_update()
+        products = {product.pk: product for product in qs}
+        for pk in sorted(quantities):
+            qty = quantities[pk]
+            product = products.get(pk)
+            if product is None:
+                # Товар удалили после добавления в корзину
+                raise ProductUnavailableError('Товар больше не продается, удалите его из корзины')
+            locked[content_type_id, pk] = product
+            if product.stock is None:
+                continue
+            if product.stock < qty:
+                raise OutOfStockError(product)
+            updated = model._base_manager.filter(pk=pk, stock__gte=qty).update(stock=F('stock') - qty)
+            if not updated:
+                raise OutOfStockError(product)
+    return locked
+
+
+def reprice_lines(lines, products):
+    """
+    Пересчитывает строки корзины по текущим ценам товаров: цена в строке
+    запомнена при добавлении и могла устареть. Возвращает (штук, сумма).
+    """
+    changed = []
+    total_products, final_price = 0, Decimal('0')
+    for line in lines:
+        price = products[line.content_type_id, line.object_id].price * line.qtr
+        if price != line.final_price:
+            line.final_price = price
+            changed.append(line)
+        total_products += line.qtr
+        final_price += price
+    if changed:
+        CartProduct.objects.bulk_update(changed, ['final_price'])
+    return total_products, final_price
+
+
+def place_order(customer, idempotency_key, phone, address):
+    """
+    Оформляет открытую корзину покупателя. Повторный запрос с тем же
+    idempotency_key возвращает уже созданный заказ.
+    """
+    order = get_order_by_key(customer, idempotency_key)
+    if order is not None:
+        return order
+    try:
+        with transaction.atomic():
+            cart = Cart.objects.select_for_update().filter(owner=customer, in_order=False).first()
+            if cart is None:
+                raise EmptyCartError('Корзина пуста')
+            lines = list(CartProduct.objects.filter(cart=cart))
+            if not lines:
+                raise EmptyCartError('Корзина пуста')
+            products = reserve_stock(lines)
+            total_products, final_price = reprice_lines(lines, products)
+            order = Order.objects.create(
+                customer=customer, cart=cart, phone=phone, address=address,
+                total_products=total_products, final_price=final_price,
+                idempotency_key=idempotency_key,
+            )
+            Cart.objects.filter(pk=cart.pk).update(
+                in_order=True, total_products=total_products, final_price=final_price)
+            OutboxEvent.objects.create(topic=ORDER_PLACED, payload={'order_id': order.pk})
+    except IntegrityError:
+        # Параллельный запрос с тем же ключом успел создать заказ
+        order = get_order_by_key(customer, idempotency_key)
+        if order is None:
+            raise
+    return order
+
+
+def get_order_by_key(customer, idempotency_key):
+    order = Order.objects.filter(idempotency_key=idempotency_key).first()
+    if order is not None and order.customer_id != customer.pk:
+        raise CheckoutError('Ключ заказа уже использован')
+    return order
+
+
+def handle_order_placed(payload):
+    order = Order.objects.select_related('customer__user').get(pk=payload['order_id'])
+    user = order.customer.user
+    if user.email:
+        user.email_user(
+            'Заказ №{} принят'.format(order.pk),
+            'Сумма заказа: {} руб. Мы свяжемся с вами по телефону {}.'.format(order.final_price, order.phone),
+        )
+    logger.info('Заказ %s оформлен на сумму %s', order.pk, order.final_price)
+
+
+OUTBOX_HANDLERS = {
+    ORDER_PLACED: handle_order_placed,
+}
+
+
+def claim_events(batch_size=100, max_attempts=5, lease=timedelta(minutes=5)):
+    """
+    Берет события в аренду одним коротким UPDATE и возвращает их. Условие
+    аренды повторяется в UPDATE, поэтому событие, которое успел занять
+    другой обработчик, не попадет в пачку (SKIP LOCKED на SQLite нет).
+    Попытка засчитывается сразу: упавший посреди обработки процесс тоже
+    расходует попытку, а событие вернется в очередь по истечении аренды.
+    """
+    now = timezone.now()
+    available = Q(processed_at__isnull=True, attempts__lt=max_attempts) & (
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+    candidates = list(OutboxEvent.objects.filter(available).order_by('id').values_list('pk', flat=True)[:batch_size])
+    if not candidates:
+        return []
+    token = uuid.uuid4().hex
+    OutboxEvent.objects.filter(available, pk__in=candidates).update(
+        locked_until=now + lease, lock_token=token, attempts=F('attempts') + 1)
+    return list(OutboxEvent.objects.filter(lock_token=token).order_by('id'))
+
+
+def process_outbox(batch_size=100, max_attempts=5, lease=timedelta(minutes=5)):
+    """
+    Обрабатывает очередную пачку событий. Возвращает число обработанных.
+    Обработчики (в том числе отправка почты) выполняются вне транзакции,
+    каждое событие отмечается отдельно.
+    """
+    processed = 0
+    for event in claim_events(batch_size, max_attempts, lease):
+        if timezone.now() >= event.locked_until:
+            # Аренда истекла - остаток пачки может уже обрабатывать другой процесс
+            break
+        owned = OutboxEvent.objects.filter(pk=event.pk, lock_token=event.lock_token)
+        handler = OUTBOX_HANDLERS.get(event.topic)
+        try:
+            if handler is not None:
+                handler(event.payload)
+        except Exception as exc:
+            logger.exception('Ошибка обработки события %s', event)
+            owned.update(locked_until=None, last_error=str(exc))
+            continue
+        owned.update(processed_at=timezone.now(), locked_until=None)
+        processed += 1
+    return processed
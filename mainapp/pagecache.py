@@ -0,0 +1,129 @@
+"""
+Кэш целых страниц для анонимных посетителей с инвалидацией по тегам.
+
+Вью помечает страницу тегами (add_page_tags), от которых она зависит:
+товар, категория, сайдбар. Для каждого тега в кэше хранится время последней
+очистки; запись страницы действительна, пока все ее теги очищались раньше,
+чем страница начала рендериться. purge_tags() делает недействительными ровно
+страницы с этими тегами, без перебора ключей.
+
+Хранилище - отдельный алиас кэша (settings.PAGE_CACHE_ALIAS): LocMemCache
+для одного процесса или FileBasedCache, общий для процессов на сервере.
+"""
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+PAGE_KEY = 'page:{}'
+TAG_KEY = 'page:tag:{}'
+SIDEBAR_TAG = 'sidebar'
+HOME_TAG = 'home'
+
+CSRF_PLACEHOLDER = b'__CSRF_TOKEN__'
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+# Заголовки, которые не сохраняются вместе со страницей
+SKIP_HEADERS = {'set-cookie', 'etag', 'content-length'}
+
+
+def product_tag(product):
+    return 'product:{}:{}'.format(product._meta.model_name, product.pk)
+
+
+def category_tag(category_id):
+    return 'category:{}'.format(category_id)
+
+
+def add_page_tags(request, *tags):
+    request.page_cache_tags = getattr(request, 'page_cache_tags', set()) | set(tags)
+
+
+def get_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'pages')]
+
+
+def purge_tags(*tags):
+    now = time.time()
+    get_cache().set_many({TAG_KEY.format(tag): now for tag in tags}, None)
+
+
+class PageCache:
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return get_cache()
+
+    @staticmethod
+    def page_key(request):
+        variant = '{}:{}:{}'.format(request.scheme, request.get_host(), request.get_full_path())
+        return PAGE_KEY.format(hashlib.md5(variant.encode()).hexdigest())
+
+    def get(self, request):
+        entry = self.cache.get(self.page_key(request))
+        if entry is None:
+            return None
+        keys = [TAG_KEY.format(tag) for tag in entry['tags']]
+        purged = self.cache.get_many(keys)
+        # Ключ тега вытеснен - неизвестно, когда его очищали, считаем запись устаревшей
+        if len(purged) != len(keys) or any(value > entry['created'] for value in purged.values()):
+            return None
+        return entry
+
+    def set(self, request, response, started):
+        tags = request.page_cache_tags
+        # Тегам без записи ставим время начала запроса: очистка после него сделает страницу устаревшей
+        for tag in tags:
+            self.cache.add(TAG_KEY.format(tag), started, None)
+        content = CSRF_INPUT_RE.sub(rb'\1' + CSRF_PLACEHOLDER + rb'\2', response.content)
+        self.cache.set(self.page_key(request), {
+            'created': started,
+            'tags': sorted(tags),
+            'status': response.status_code,
+            'headers': [(k, v) for k, v in response.items() if k.lower() not in SKIP_HEADERS],
+            'content': content,
+            'digest': hashlib.md5(content).hexdigest(),
+        }, self.timeout)
+
+    @staticmethod
+    def build_response(request, entry):
+        # ETag зависит от cookie CSRF: токен подставляется в страницу при выдаче
+        etag = quote_etag(hashlib.md5('{}:{}'.format(
+            entry['digest'], request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')).encode()).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content = entry['content']
+            if CSRF_PLACEHOLDER in content:
+                content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+            response = HttpResponse(content, status=entry['status'])
+        for header, value in entry['headers']:
+            if response.status_code != 304 or header.lower() != 'content-type':
+                response[header] = value
+        response['ETag'] = etag
+        return response
+
+
+def is_cacheable_request(request):
+    if request.method != 'GET':
+        return False
+    # Без cookie сессии пользователь точно анонимный, базу не трогаем
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+        return False
+    return True
+
+
+def is_cacheable_response(request, response):
+    if not getattr(request, 'page_cache_tags', None):
+        return False
+    if response.status_code != 200 or response.streaming:
+        return False
+    cache_control = response.get('Cache-Control', '')
+    return 'private' not in cache_control and 'no-store' not in cache_control
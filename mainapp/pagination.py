@@ -0,0 +1,77 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод без OFFSET: следующая страница ищется по значениям
+    полей сортировки последней записи, поэтому любая страница стоит как первая.
+    Последним полем ordering должно быть уникальное поле (обычно id).
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def page(self, cursor=None):
+        qs = self.queryset.order_by(*self.ordering)
+        if cursor:
+            try:
+                qs = qs.filter(self._seek(self.decode_cursor(cursor)))
+            except (ValidationError, ValueError):
+                raise InvalidCursor(cursor)
+        object_list = list(qs[:self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, next_cursor)
+
+    def encode_cursor(self, obj):
+        values = [str(getattr(obj, name)) for name, _ in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(cursor + padding).decode())
+        except (TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise InvalidCursor(cursor)
+        return values
+
+    def _seek(self, values):
+        # (a, b) > (x, y)  ==>  a > x OR (a = x AND b > y)
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.fields, values):
+            lookup = '{}__{}'.format(name, 'lt' if descending else 'gt')
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
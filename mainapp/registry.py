@@ -0,0 +1,79 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class ProductType:
+
+    def __init__(self, model):
+        self.model = model
+        self.ct_model = model._meta.model_name
+        self.spec = dict(getattr(model, 'SPECIFICATION', {}))
+        self.spec_fields = tuple(self.spec.values())
+
+    def __repr__(self):
+        return '<ProductType: {}>'.format(self.ct_model)
+
+    @cached_property
+    def content_type_id(self):
+        return ContentType.objects.get_for_model(self.model).id
+
+
+class ProductTypeRegistry:
+    """
+    Все конкретные наследники Product, собранные один раз в AppConfig.ready().
+    """
+
+    def __init__(self):
+        self._by_ct_model = {}
+        self._by_model = {}
+        self._by_content_type_id = None
+
+    def build(self):
+        from .models import Product
+        self._by_ct_model.clear()
+        self._by_model.clear()
+        for model in apps.get_models():
+            if issubclass(model, Product):
+                self.register(model)
+
+    def register(self, model):
+        product_type = ProductType(model)
+        self._by_ct_model[product_type.ct_model] = product_type
+        self._by_model[model] = product_type
+        self._by_content_type_id = None
+        return product_type
+
+    def __iter__(self):
+        return iter(self._by_ct_model.values())
+
+    def __len__(self):
+        return len(self._by_ct_model)
+
+    def __contains__(self, ct_model):
+        return ct_model in self._by_ct_model
+
+    @property
+    def models(self):
+        return tuple(self._by_model)
+
+    def get(self, ct_model):
+        return self._by_ct_model[ct_model]
+
+    def get_or_404(self, ct_model):
+        try:
+            return self._by_ct_model[ct_model]
+        except KeyError:
+            raise Http404('Неизвестный тип продукта: {}'.format(ct_model))
+
+    def for_model(self, model):
+        return self._by_model[model._meta.concrete_model]
+
+    def for_content_type_id(self, content_type_id):
+        if self._by_content_type_id is None:
+            self._by_content_type_id = {pt.content_type_id: pt for pt in self}
+        return self._by_content_type_id[content_type_id]
+
+
+product_types = ProductTypeRegistry()
@@ -0,0 +1,242 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+SEARCH_TABLE = 'mainapp_search_index'
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Окончания для упрощенного стемминга, от длинных к коротким
+RUSSIAN_ENDINGS = sorted({
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях',
+    'ов', 'ев', 'ую', 'юю', 'ию', 'ия', 'ии', 'ью',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+}, key=len, reverse=True)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(str(text or ''))]
+
+
+def highlight(text, query):
+    """
+    Оборачивает в <mark> слова текста, основа которых совпадает с началом основы из запроса.
+    """
+    stems = tokenize(query)
+    if not stems:
+        return escape(text)
+    parts = []
+    position = 0
+    for match in WORD_RE.finditer(text):
+        word_stem = stem(match.group())
+        parts.append(escape(text[position:match.start()]))
+        if any(word_stem.startswith(s) or s.startswith(word_stem) for s in stems):
+            parts.append('<mark>{}</mark>'.format(escape(match.group())))
+        else:
+            parts.append(escape(match.group()))
+        position = match.end()
+    parts.append(escape(text[position:]))
+    return mark_safe(''.join(parts))
+
+
+def get_document(product, product_type):
+    specs = ' '.join(str(getattr(product, field) or '') for field in product_type.spec_fields)
+    return {
+        'title': product.title,
+        'title_stems': ' '.join(tokenize(product.title)),
+        'body_stems': ' '.join(tokenize(product.description) + tokenize(specs)),
+    }
+
+
+class BaseSearchBackend:
+
+    def index(self, entry_id, document):
+        self.index_many([(entry_id, document)])
+
+    def index_many(self, documents):
+        raise NotImplementedError
+
+    def remove(self, entry_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, limit=20):
+        raise NotImplementedError
+
+    def suggest(self, prefix, limit=10):
+        raise NotImplementedError
+
+
+class SqliteFTS5Backend(BaseSearchBackend):
+    """
+    Индекс в виртуальной таблице FTS5. В таблицу пишутся уже нормализованные
+    основы слов, поэтому для поиска нужен только встроенный токенайзер unicode61.
+    id записи каталога - это rowid: удаление и замена идут по первичному
+    ключу, а не перебором таблицы.
+    """
+
+    @staticmethod
+    def _delete(cursor, entry_ids):
+        cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(
+            SEARCH_TABLE, ', '.join(['%s'] * len(entry_ids))), entry_ids)
+
+    def index_many(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        with connection.cursor() as cursor:
+            self._delete(cursor, [entry_id for entry_id, _ in documents])
+            cursor.executemany(
+                'INSERT INTO {} (rowid, title, title_stems, body_stems) VALUES (%s, %s, %s, %s)'.format(
+                    SEARCH_TABLE),
+                [(entry_id, d['title'], d['title_stems'], d['body_stems']) for entry_id, d in documents])
+
+    def remove(self, entry_ids):
+        entry_ids = list(entry_ids)
+        if entry_ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, entry_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(SEARCH_TABLE))
+
+    @staticmethod
+    def build_match(stems):
+        return ' AND '.join('"{}"*'.format(s) for s in stems)
+
+    def _match(self, expression, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM {0} WHERE {0} MATCH %s '
+                'ORDER BY bm25({0}, 0, 0, 10.0, 1.0) LIMIT %s'.format(SEARCH_TABLE), [expression, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def search(self, query, limit=20):
+        stems = tokenize(query)
+        return self._match(self.build_match(stems), limit) if stems else []
+
+    def suggest(self, prefix, limit=10):
+        stems = tokenize(prefix)
+        return self._match('title_stems : ({})'.format(self.build_match(stems)), limit) if stems else []
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Индекс в таблице с колонкой tsvector и GIN-индексом. Основы слов получаем
+    той же функцией stem(), поэтому используется словарь 'simple'.
+    """
+
+    def index_many(self, documents):
+        documents = list(documents)
+        if not documents:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO {} (entry_id, title, document) VALUES ('
+                '%s, %s, setweight(to_tsvector(\'simple\', %s), \'A\') || '
+                'setweight(to_tsvector(\'simple\', %s), \'B\')) '
+                'ON CONFLICT (entry_id) DO UPDATE SET title = EXCLUDED.title, '
+                'document = EXCLUDED.document'.format(SEARCH_TABLE),
+                [(entry_id, d['title'], d['title_stems'], d['body_stems']) for entry_id, d in documents])
+
+    def remove(self, entry_ids):
+        entry_ids = list(entry_ids)
+        if entry_ids:
+            with connection.cursor() as cursor:
+                cursor.execute('DELETE FROM {} WHERE entry_id = ANY(%s)'.format(SEARCH_TABLE), [entry_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('TRUNCATE {}'.format(SEARCH_TABLE))
+
+    def search(self, query, limit=20):
+        stems = tokenize(query)
+        if not stems:
+            return []
+        tsquery = ' & '.join('{}:*'.format(s) for s in stems)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT entry_id FROM {} WHERE document @@ to_tsquery(\'simple\', %s) '
+                'ORDER BY ts_rank(document, to_tsquery(\'simple\', %s)) DESC LIMIT %s'.format(SEARCH_TABLE),
+                [tsquery, tsquery, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def suggest(self, prefix, limit=10):
+        stems = tokenize(prefix)
+        if not stems:
+            return []
+        tsquery = ' & '.join('{}:*A'.format(s) for s in stems)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT entry_id FROM {} WHERE document @@ to_tsquery(\'simple\', %s) LIMIT %s'.format(
+                    SEARCH_TABLE), [tsquery, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """
+    Запасной вариант для баз без полнотекстового бэкенда: отдельного индекса
+    нет, ищем LIKE по названиям в CatalogEntry. Индексация - пустые операции,
+    поэтому сохранение товаров из сигналов не ломается.
+    """
+
+    def index_many(self, documents):
+        pass
+
+    def remove(self, entry_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    @staticmethod
+    def _filter(query, lookup, limit):
+        from .models import CatalogEntry
+        words = WORD_RE.findall(query)
+        if not words:
+            return []
+        qs = CatalogEntry.objects.all()
+        for word in words:
+            qs = qs.filter(**{lookup: word})
+        return list(qs.order_by('-created_at', '-id').values_list('id', flat=True)[:limit])
+
+    def search(self, query, limit=20):
+        return self._filter(query, 'title__icontains', limit)
+
+    def suggest(self, prefix, limit=10):
+        return self._filter(prefix, 'title__icontains', limit)
+
+
+SEARCH_BACKENDS = {
+    'sqlite': 'mainapp.search.SqliteFTS5Backend',
+    'postgresql': 'mainapp.search.PostgresSearchBackend',
+}
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None) or SEARCH_BACKENDS.get(
+            connection.vendor, 'mainapp.search.LikeSearchBackend')
+        _backend = import_string(path)()
+    return _backend
@@ -0,0 +1,299 @@
+"""
+Синтетический каталог для замеров и тестов: товары с правдоподобными
+характеристиками, покупатели и их открытые корзины. При одинаковом seed
+данные одинаковые.
+
+Все товары одного типа ссылаются на одно изображение-заглушку (хранилище
+адресует файлы по содержимому, повторное создание файл не дублирует).
+Товары пишутся bulk_create, поэтому сайдбар, кэш страниц, витрина каталога
+и поисковый индекс обновляются в finish(), как и при импорте (catalog_io).
+"""
+import io
+import random
+from array import array
+import time
+from decimal import Decimal
+
+from PIL import Image, ImageDraw
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import sidebar_counts
+from .catalog_io import batched
+from .models import Cart, CartProduct, Category, Customer
+from .pagecache import HOME_TAG, SIDEBAR_TAG, purge_tags
+from .registry import product_types
+from .storage import product_image_storage
+
+SLUG_PREFIX = 'seed'
+PLACEHOLDER_SIZE = (800, 800)
+
+CATEGORY_NAMES = {
+    'notebook': 'Ноутбуки',
+    'smartphone': 'Смартфоны',
+}
+
+BRANDS = {
+    'notebook': ['Lenovo IdeaPad', 'Asus VivoBook', 'Acer Aspire', 'HP Pavilion', 'Dell Inspiron', 'Honor MagicBook'],
+    'smartphone': ['Samsung Galaxy', 'Xiaomi Redmi', 'Apple iPhone', 'Realme', 'Honor', 'Nokia'],
+}
+
+SPEC_VALUES = {
+    'notebook': {
+        'diagonal': ['13.3', '14', '15.6', '16', '17.3'],
+        'display_type': ['IPS', 'TN', 'OLED', 'VA'],
+        'processor_freg': ['2.1 ГГц', '2.4 ГГц', '2.8 ГГц', '3.2 ГГц', '3.6 ГГц'],
+        'ram': ['4 ГБ', '8 ГБ', '16 ГБ', '32 ГБ'],
+        'video': ['Встроенная', '2 ГБ', '4 ГБ', '6 ГБ', '8 ГБ'],
+        'time_without_charge': ['4 ч', '6 ч', '8 ч', '10 ч', '12 ч'],
+    },
+    'smartphone': {
+        'diagonal': ['5.5', '6.1', '6.4', '6.7'],
+        'display_type': ['IPS', 'AMOLED', 'Super AMOLED', 'OLED'],
+        'resolution': ['1280x720', '1920x1080', '2400x1080', '2778x1284'],
+        'ram': ['2 ГБ', '3 ГБ', '4 ГБ', '6 ГБ', '8 ГБ', '12 ГБ'],
+        'sd': [True, False],
+        'sd_vol_max': ['128 ГБ', '256 ГБ', '512 ГБ', '1 ТБ'],
+        'accum_volue': ['3000 мАч', '4000 мАч', '4500 мАч', '5000 мАч', '6000 мАч'],
+        'main_cam_up': ['12 Мп', '48 Мп', '50 Мп', '64 Мп', '108 Мп'],
+        'frontal_cam_up': ['5 Мп', '8 Мп', '12 Мп', '16 Мп', '32 Мп'],
+    },
+}
+
+DESCRIPTIONS = [
+    'Надежная модель на каждый день.',
+    'Легкий корпус и долгое время работы.',
+    'Производительность для работы и игр.',
+    'Оптимальное соотношение цены и возможностей.',
+]
+
+FIRST_NAMES = ['Иван', 'Анна', 'Сергей', 'Мария', 'Алексей', 'Елена', 'Дмитрий', 'Ольга']
+LAST_NAMES = ['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Петров', 'Соколов', 'Новиков']
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург', 'Минск']
+STREETS = ['Ленина', 'Советская', 'Мира', 'Садовая', 'Центральная', 'Школьная']
+
+PRICE_RANGES = {
+    'notebook': (25000, 250000),
+    'smartphone': (5000, 150000),
+}
+
+
+def placeholder_image(product_type):
+    """
+    Имя в хранилище картинки-заглушки для типа товара. Содержимое
+    детерминировано, поэтому файл создается один раз.
+    """
+    color = tuple(random.Random(product_type.ct_model).randrange(64, 224) for _ in range(3))
+    image = Image.new('RGB', PLACEHOLDER_SIZE, color)
+    ImageDraw.Draw(image).text((40, 40), product_type.ct_model, fill=(255, 255, 255))
+    stream = io.BytesIO()
+    image.save(stream, 'PNG')
+    return product_image_storage.save('{}.png'.format(product_type.ct_model), ContentFile(stream.getvalue()))
+
+
+def get_category(product_type):
+    category, _ = Category.object.get_or_create(
+        slug=product_type.ct_model,
+        defaults={'name': CATEGORY_NAMES.get(product_type.ct_model, product_type.model._meta.verbose_name_plural)},
+    )
+    return category
+
+
+class ProductPool:
+    """
+    pk всех товаров каталога для наполнения корзин. На миллионах товаров
+    список кортежей не поместится в память, поэтому pk хранятся в array.
+    """
+
+    def __init__(self, types=None):
+        self.parts = []
+        for product_type in product_types if types is None else types:
+            pks = array('q', product_type.model._base_manager.order_by('pk').values_list('pk', flat=True).iterator())
+            if pks:
+                self.parts.append((product_type, pks))
+
+    def __len__(self):
+        return sum(len(pks) for _, pks in self.parts)
+
+    def choice(self, rng):
+        index = rng.randrange(len(self))
+        for product_type, pks in self.parts:
+            if index < len(pks):
+                return product_type, pks[index]
+            index -= len(pks)
+
+
+class SeedStats:
+
+    def __init__(self):
+        self.created = {}
+        self.started = time.monotonic()
+
+    @property
+    def total(self):
+        return sum(self.created.values())
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def __str__(self):
+        return 'создано: {} ({}), {:.1f} с, {:.0f} строк/с'.format(
+            self.total, ', '.join('{}: {}'.format(name, count) for name, count in self.created.items()),
+            self.elapsed, self.total / self.elapsed if self.elapsed else 0.0)
+
+
+class CatalogSeeder:
+    """
+    counts - {ct_model: сколько товаров создать}. Slug новых товаров
+    (и логины покупателей) продолжают нумерацию seed-<тип>-<номер>, поэтому
+    повторный запуск добавляет данные, а не падает на уникальности.
+
+    У каждого покупателя - открытая корзина с 0..max_cart_items товарами
+    из всего каталога.
+    """
+
+    def __init__(self, seed=0, batch_size=2000, rebuild=True):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.rebuild = rebuild
+        self.stats = SeedStats()
+        self.categories = set()
+
+    def run(self, counts, customers=0, max_cart_items=4, progress=None):
+        for ct_model, count in counts.items():
+            if count > 0:
+                self.seed_type(product_types.get(ct_model), count, progress)
+        if customers > 0:
+            self.seed_customers(customers, max_cart_items, progress)
+        self.finish()
+        return self.stats
+
+    def count(self, name, created):
+        self.stats.created[name] = self.stats.created.get(name, 0) + created
+
+    @staticmethod
+    def slug_prefix(product_type):
+        return '{}-{}-'.format(SLUG_PREFIX, product_type.ct_model)
+
+    def random_for(self, product_type, start):
+        # Отдельный генератор на тип и номер первого товара: результат не зависит от порядка типов
+        return random.Random('{}:{}:{}'.format(self.seed, product_type.ct_model, start))
+
+    def build_product(self, product_type, rng, number, category, image):
+        brand = rng.choice(BRANDS.get(product_type.ct_model, [product_type.model._meta.verbose_name]))
+        title = '{} {}'.format(brand, number)
+        low, high = PRICE_RANGES.get(product_type.ct_model, (1000, 100000))
+        values = {}
+        for field in product_type.spec_fields:
+            choices = SPEC_VALUES.get(product_type.ct_model, {}).get(field) or ['—']
+            values[field] = rng.choice(choices)
+        if values.get('sd') is False:
+            values['sd_vol_max'] = None
+        return product_type.model(
+            category=category,
+            title=title,
+            slug=self.slug_prefix(product_type) + str(number),
+            image=image,
+            description=rng.choice(DESCRIPTIONS),
+            price=rng.randrange(low, high, 10),
+            stock=rng.randrange(0, 50),
+            **values
+        )
+
+    def seed_type(self, product_type, count, progress=None):
+        model = product_type.model
+        category = get_category(product_type)
+        self.categories.add(category.pk)
+        image = placeholder_image(product_type)
+        start = model._base_manager.filter(slug__startswith=self.slug_prefix(product_type)).count() + 1
+        rng = self.random_for(product_type, start)
+        numbers = range(start, start + count)
+        for batch in batched(numbers, self.batch_size):
+            products = [self.build_product(product_type, rng, number, category, image) for number in batch]
+            with transaction.atomic():
+                model._base_manager.bulk_create(products, batch_size=self.batch_size)
+            self.count(product_type.ct_model, len(batch))
+            if progress is not None:
+                progress(self.stats)
+
+    def seed_customers(self, count, max_cart_items, progress=None):
+        user_model = get_user_model()
+        prefix = '{}-user-'.format(SLUG_PREFIX)
+        start = user_model._default_manager.filter(username__startswith=prefix).count() + 1
+        rng = random.Random('{}:customers:{}'.format(self.seed, start))
+        pool = ProductPool() if max_cart_items > 0 else ProductPool(types=())
+        # Вход под сгенерированными пользователями не нужен: один неиспользуемый пароль на всех
+        password = make_password(None)
+        for batch in batched(range(start, start + count), self.batch_size):
+            with transaction.atomic():
+                users = []
+                for number in batch:
+                    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                    users.append(user_model(
+                        username=prefix + str(number), password=password, first_name=first_name,
+                        last_name=last_name, email='{}{}@example.com'.format(prefix, number)))
+                user_model._default_manager.bulk_create(users, batch_size=self.batch_size)
+                # SQLite не возвращает id из bulk_create, дочитываем по уникальным полям
+                user_ids = user_model._default_manager.filter(
+                    username__in=[user.username for user in users]).values_list('pk', flat=True)
+                Customer.objects.bulk_create([
+                    Customer(user_id=user_id, phone='+7{:010d}'.format(rng.randrange(10 ** 10)),
+                             address='{}, ул. {}, д. {}'.format(
+                                 rng.choice(CITIES), rng.choice(STREETS), rng.randrange(1, 200)))
+                    for user_id in user_ids
+                ], batch_size=self.batch_size)
+                customer_ids = list(Customer.objects.filter(user_id__in=list(user_ids)).values_list('pk', flat=True))
+                self.seed_carts(rng, customer_ids, pool, max_cart_items)
+            self.count('customer', len(batch))
+            if progress is not None:
+                progress(self.stats)
+
+    def seed_carts(self, rng, customer_ids, pool, max_cart_items):
+        picked = {}
+        for customer_id in customer_ids:
+            size = rng.randint(0, min(max_cart_items, len(pool)))
+            picked[customer_id] = [(*pool.choice(rng), rng.randint(1, 3)) for _ in range(size)]
+        prices = {}
+        for product_type in product_types:
+            pks = {pk for items in picked.values() for item_type, pk, _ in items if item_type is product_type}
+            if pks:
+                prices[product_type] = dict(
+                    product_type.model._base_manager.filter(pk__in=pks).values_list('pk', 'price'))
+        carts = []
+        for customer_id, items in picked.items():
+            # Повторно выпавший товар - одна строка корзины (unique_cart_product)
+            lines = {}
+            for product_type, pk, qty in items:
+                lines[product_type, pk] = lines.get((product_type, pk), 0) + qty
+            picked[customer_id] = lines
+            carts.append(Cart(
+                owner_id=customer_id,
+                total_products=sum(lines.values()),
+                final_price=sum((prices[product_type][pk] * qty for (product_type, pk), qty in lines.items()),
+                                Decimal('0')),
+            ))
+        Cart.objects.bulk_create(carts, batch_size=self.batch_size)
+        cart_ids = dict(Cart.objects.filter(owner_id__in=customer_ids, in_order=False).values_list('owner_id', 'pk'))
+        CartProduct.objects.bulk_create([
+            CartProduct(user_id=customer_id, cart_id=cart_ids[customer_id],
+                        content_type_id=product_type.content_type_id, object_id=pk, qtr=qty,
+                        final_price=prices[product_type][pk] * qty)
+            for customer_id, lines in picked.items()
+            for (product_type, pk), qty in lines.items()
+        ], batch_size=self.batch_size)
+        self.count('cart', len(carts))
+
+    def finish(self):
+        if not self.categories:
+            return
+        Category.object.filter(pk__in=self.categories).update(updated_at=timezone.now())
+        sidebar_counts.invalidate()
+        purge_tags(SIDEBAR_TAG, HOME_TAG)
+        if self.rebuild:
+            call_command('rebuild_catalog', batch_size=self.batch_size, stdout=io.StringIO())
+            call_command('rebuild_search_index', batch_size=self.batch_size, stdout=io.StringIO())
@@ -0,0 +1,120 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .cache import invalidate_spec_table, sidebar_counts
+from .cart import merge_anonymous_cart
+from .images import schedule_renditions
+from .models import CatalogEntry, Category
+from .pagecache import HOME_TAG, SIDEBAR_TAG, category_tag, product_tag, purge_tags
+from .registry import product_types
+from .search import get_document, get_search_backend
+
+
+def remember_product_category(sender, instance, raw=False, using=None, **kwargs):
+    instance._previous_category_id = None
+    if instance.pk is not None and not raw:
+        # Из базы, в которую идет запись: реплика может отставать
+        instance._previous_category_id = sender._base_manager.using(using).filter(
+            pk=instance.pk).values_list('category_id', flat=True).first()
+
+
+def update_sidebar_counts_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        transaction.on_commit(sidebar_counts.invalidate)
+        return
+    previous_category_id = getattr(instance, '_previous_category_id', None)
+    category_id = instance.category_id
+    if previous_category_id == category_id:
+        return
+
+    def apply():
+        if previous_category_id is not None:
+            sidebar_counts.add(previous_category_id, -1)
+        sidebar_counts.add(category_id, 1)
+
+    transaction.on_commit(apply)
+
+
+def update_sidebar_counts_on_delete(sender, instance, **kwargs):
+    category_id = instance.category_id
+    transaction.on_commit(lambda: sidebar_counts.add(category_id, -1))
+
+
+def invalidate_sidebar_counts(sender, **kwargs):
+    transaction.on_commit(sidebar_counts.invalidate)
+
+
+def sync_catalog_entry(sender, instance, raw=False, **kwargs):
+    if not raw:
+        entry = CatalogEntry.objects.sync(instance)
+        get_search_backend().index(entry.id, get_document(instance, product_types.for_model(sender)))
+
+
+def delete_catalog_entry(sender, instance, **kwargs):
+    get_search_backend().remove(CatalogEntry.objects.remove(instance))
+
+
+def touch_product_category(sender, instance, raw=False, **kwargs):
+    # Страница категории зависит от ее товаров: сдвигаем updated_at без сигналов Category
+    category_ids = {instance.category_id, getattr(instance, '_previous_category_id', None)} - {None}
+    if not raw and category_ids:
+        Category.object.filter(pk__in=category_ids).update(updated_at=timezone.now())
+
+
+def purge_product_pages_on_save(sender, instance, created, raw=False, **kwargs):
+    previous_category_id = getattr(instance, '_previous_category_id', None)
+    tags = {product_tag(instance), category_tag(instance.category_id), HOME_TAG}
+    # Счетчики сайдбара меняются только у нового или перенесенного товара
+    if raw or previous_category_id != instance.category_id:
+        tags.add(SIDEBAR_TAG)
+        if previous_category_id is not None:
+            tags.add(category_tag(previous_category_id))
+    transaction.on_commit(lambda: purge_tags(*tags))
+
+
+def purge_product_pages_on_delete(sender, instance, **kwargs):
+    tags = (product_tag(instance), category_tag(instance.category_id), SIDEBAR_TAG, HOME_TAG)
+    transaction.on_commit(lambda: purge_tags(*tags))
+
+
+def purge_category_pages(sender, instance, **kwargs):
+    tags = (category_tag(instance.pk), SIDEBAR_TAG)
+    transaction.on_commit(lambda: purge_tags(*tags))
+
+
+def invalidate_product_spec(sender, instance, **kwargs):
+    model_name, pk = sender._meta.model_name, instance.pk
+    transaction.on_commit(lambda: invalidate_spec_table(model_name, pk))
+
+
+def process_product_image(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image and not instance.image_hash:
+        transaction.on_commit(lambda: schedule_renditions(instance))
+
+
+def merge_anonymous_cart_on_login(sender, request, user, **kwargs):
+    if request is not None:
+        merge_anonymous_cart(request, user)
+
+
+def connect_signals():
+    for model in product_types.models:
+        pre_save.connect(remember_product_category, sender=model)
+        post_save.connect(update_sidebar_counts_on_save, sender=model)
+        post_delete.connect(update_sidebar_counts_on_delete, sender=model)
+        post_save.connect(sync_catalog_entry, sender=model)
+        post_delete.connect(delete_catalog_entry, sender=model)
+        post_save.connect(touch_product_category, sender=model)
+        post_delete.connect(touch_product_category, sender=model)
+        post_save.connect(invalidate_product_spec, sender=model)
+        post_delete.connect(invalidate_product_spec, sender=model)
+        post_save.connect(process_product_image, sender=model)
+        post_save.connect(purge_product_pages_on_save, sender=model)
+        post_delete.connect(purge_product_pages_on_delete, sender=model)
+    post_save.connect(invalidate_sidebar_counts, sender=Category)
+    post_delete.connect(invalidate_sidebar_counts, sender=Category)
+    post_save.connect(purge_category_pages, sender=Category)
+    post_delete.connect(purge_category_pages, sender=Category)
+    user_logged_in.connect(merge_anonymous_cart_on_login)
@@ -0,0 +1,68 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = 'products'
+TMP_DIR = 'tmp'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файлы хранятся под SHA-1 своего содержимого: products/ab/abcdef....jpg.
+    Хэш считается по мере записи во временный файл, одинаковые загрузки
+    указывают на один и тот же файл. Неиспользуемые файлы удаляет команда media_gc.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя определяется содержимым в _save(), суффиксы не нужны
+        return name
+
+    @staticmethod
+    def hashed_name(digest, extension):
+        return posixpath.join(BLOB_DIR, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        tmp_dir = self.path(TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=extension)
+        try:
+            sha = hashlib.sha1()
+            with os.fdopen(fd, 'wb') as tmp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    sha.update(chunk)
+                    tmp_file.write(chunk)
+            name = self.hashed_name(sha.hexdigest(), extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(tmp_path)
+                # media_gc не трогает файлы моложе grace: новая ссылка на старый файл
+                # еще не закоммичена, продлеваем его жизнь
+                os.utime(full_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(tmp_path, full_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(full_path, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name.replace('\\', '/')
+
+    def blobs(self):
+        root = self.path(BLOB_DIR)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                yield posixpath.join(BLOB_DIR, os.path.relpath(full_path, root).replace(os.sep, '/')), full_path
+
+
+product_image_storage = ContentAddressedStorage()
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from mainapp.assets import bundle_urls
+
+register = template.Library()
+
+
+@register.simple_tag
+def stylesheet(name):
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((url,) for url in bundle_urls('css', name)))
+
+
+@register.simple_tag
+def javascript(name):
+    # defer: скрипты не блокируют разбор страницы, порядок выполнения сохраняется
+    return format_html_join('\n', '<script src="{}" defer></script>', ((url,) for url in bundle_urls('js', name)))
@@ -0,0 +1,37 @@
+from django import template
+from django.utils.html import format_html
+
+from mainapp.images import rendition_url
+
+register = template.Library()
+
+# Какой вариант отдавать для плотности 2x
+RETINA_RENDITION = {
+    'thumbnail': 'card',
+    'card': 'detail',
+    'detail': 'detail',
+}
+
+
+@register.simple_tag
+def product_picture(product, rendition='card', css_class='img-fluid', loading='lazy'):
+    """
+    <picture> с WebP и JPEG вариантами и srcset. Пока варианты не готовы
+    (image_hash пустой), отдаем исходное изображение.
+    """
+    image = product.image
+    if not image:
+        return ''
+    if not product.image_hash:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="{}">',
+                           image.url, product.title, css_class, loading)
+    image_hash, retina = product.image_hash, RETINA_RENDITION[rendition]
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{} 1x, {} 2x">'
+        '<img src="{}" srcset="{} 1x, {} 2x" alt="{}" class="{}" loading="{}">'
+        '</picture>',
+        rendition_url(image_hash, rendition, 'webp'), rendition_url(image_hash, retina, 'webp'),
+        rendition_url(image_hash, rendition), rendition_url(image_hash, rendition),
+        rendition_url(image_hash, retina), product.title, css_class, loading,
+    )
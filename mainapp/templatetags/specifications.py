@@ -1,6 +1,13 @@
+from functools import lru_cache
+
 from django import template
+from django.core.cache import cache
+from django.utils.html import conditional_escape, escape
 from django.utils.safestring import mark_safe
 
+from mainapp.cache import SPEC_CACHE_TIMEOUT, spec_table_key
+from mainapp.registry import product_types
+
 register = template.Library()
 
 TABLE_HEADER = '''
@@ -20,37 +27,34 @@ TABLE_CONTENT = '''
                 </tr>
                 '''
 
-PRODUCT_SPEC = {
-    'notebook': {
-        'Диагональ': 'diagonal',
-        'Тип дисплея': 'display_type',
-        'Частота процессора': 'processor_freg',
-        'Память': 'ram',
-        'Видео память': 'video',
-        'Время работы аккумулятора': 'time_without_charge',
-    },
-    'smartphone': {
-        'Диагональ': 'diagonal',
-        'Тип дисплея': 'display_type',
-        'Разрешение экрана': 'resolution',
-        'Память': 'ram',
-        'cd карта': 'sd',
-        'Макс.обьем встроенной памяти': 'sd_vol_max',
-        'Обьем батареи': 'accum_volue',
-        'Главная камера': 'main_cam_up',
-        'Фронтальная камера': 'frontal_cam_up',
-    }
-}
+
+@lru_cache(maxsize=None)
+def get_spec_renderer(model_name):
+    """
+    Собирает один раз на модель строку-шаблон всей таблицы: подписи уже
+    вставлены, на месте значений - позиционные {}.
+    """
+    product_type = product_types.get(model_name)
+    rows = ''.join(
+        TABLE_CONTENT.format(name=escape(name).replace('{', '{{').replace('}', '}}'), value='{}')
+        for name in product_type.spec
+    )
+    table = TABLE_HEADER + rows + TABLE_FOOTER
+    fields = product_type.spec_fields
+    return lambda products: table.format(*(conditional_escape(getattr(products, field)) for field in fields))
 
 
 def get_product_spec(products, model_name):
-    table_content = ''
-    for name, value in PRODUCT_SPEC[model_name].items():
-        table_content += TABLE_CONTENT.format(name=name, value=getattr(products, value))
-    return table_content
+    key = spec_table_key(model_name, products.pk)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == products.updated_at:
+        return cached[1]
+    table = get_spec_renderer(model_name)(products)
+    cache.set(key, (products.updated_at, table), SPEC_CACHE_TIMEOUT)
+    return table
 
 
 @register.filter
 def product_spec(products):
     model_name = products.__class__._meta.model_name
-    return mark_safe(TABLE_HEADER + get_product_spec(products, model_name) + TABLE_FOOTER)
+    return mark_safe(get_product_spec(products, model_name))
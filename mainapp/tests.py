@@ -1,3 +1,492 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import caches
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from shop.db.health import check_connections
+
+from .assets import minify_css
+from .cache import sidebar_counts
+from .cart import AnonymousCart, CartService, get_customer
+from . import instrumentation
+from .catalog_io import CatalogImporter, export_rows, read_jsonl
+from .models import Cart, CartProduct, CatalogEntry, Category, Customer, Notebook, OutboxEvent, Smartphone
+from .orders import (
+    ORDER_PLACED, OutOfStockError, ProductUnavailableError, claim_events, place_order, process_outbox)
+from .registry import product_types
+from .search import LikeSearchBackend, SqliteFTS5Backend, get_document, get_search_backend
+from .seeding import CatalogSeeder
+
+
+class QueryCountTestCase(TestCase):
+    """
+    Верхние границы числа SQL-запросов: N+1 или лишний запрос в шаблоне
+    роняют тест, а не всплывают на проде. Каталог создается CatalogSeeder,
+    картинки-заглушки пишутся во временный MEDIA_ROOT.
+    """
+    products_per_type = 30
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp(prefix='shop-tests-')
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root, PAGE_CACHE_ENABLED=False)
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        CatalogSeeder(seed=1, batch_size=100).run({
+            'notebook': cls.products_per_type,
+            'smartphone': cls.products_per_type,
+        })
+
+    def setUp(self):
+        # Холодный кэш: меряем худший случай, а не попадание в сайдбар и фрагменты
+        for alias in ('default', 'pages'):
+            caches[alias].clear()
+        sidebar_counts.invalidate()
+
+    def assertMaxQueries(self, limit, url, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertLessEqual(
+            len(queries), limit,
+            '{}: {} запросов при лимите {}\n{}'.format(
+                url, len(queries), limit, '\n'.join(query['sql'] for query in queries.captured_queries)))
+        return response
+
+
+class CatalogQueryCountTests(QueryCountTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.notebook = Notebook.objects.order_by('pk').first()
+        cls.smartphone = Smartphone.objects.order_by('pk').first()
+        cls.category = cls.notebook.category
+
+    def test_home(self):
+        self.assertMaxQueries(4, reverse('base'))
+
+    def test_home_warm(self):
+        # Сайдбар и карточки из кэша, остается только лента товаров
+        self.client.get(reverse('base'))
+        self.assertMaxQueries(1, reverse('base'))
+
+    def test_product_detail(self):
+        self.assertMaxQueries(5, self.notebook.get_absolute_url())
+        self.assertMaxQueries(5, self.smartphone.get_absolute_url())
+
+    def test_category_detail(self):
+        self.assertMaxQueries(6, self.category.get_absolute_url())
+
+    def test_category_detail_filtered(self):
+        # Плюс запрос счетчиков на каждое выбранное поле (get_facets)
+        self.assertMaxQueries(7, self.category.get_absolute_url(), data={'sort': 'price', 'spec_ram': '8 гб'})
+
+    def test_facets_keep_other_values_of_selected_field(self):
+        response = self.client.get(self.category.get_absolute_url())
+        unfiltered = {facet['field']: facet for facet in response.context['facets']}
+        response = self.client.get(self.category.get_absolute_url(), data={'spec_ram': '8 гб'})
+        facets = {facet['field']: facet for facet in response.context['facets']}
+        self.assertEqual(facets['ram']['values'], [
+            dict(item, selected=item['value'] == '8 гб') for item in unfiltered['ram']['values']])
+        selected = sum(item['count'] for item in unfiltered['ram']['values'] if item['value'] == '8 гб')
+        self.assertTrue(selected)
+        self.assertEqual(sum(item['count'] for item in facets['diagonal']['values']), selected)
+
+    def test_new_sorting_pages(self):
+        # Порядок дат добавления не совпадает с порядком id
+        entries = list(CatalogEntry.objects.filter(category=self.category).order_by('id'))
+        for index, entry in enumerate(entries):
+            CatalogEntry.objects.filter(pk=entry.pk).update(
+                created_at=entry.created_at + timedelta(minutes=index % 3, microseconds=index % 2))
+        expected = list(CatalogEntry.objects.filter(category=self.category)
+                        .order_by('-created_at', '-id').values_list('pk', flat=True))
+        pks, data = [], {}
+        while True:
+            response = self.client.get(self.category.get_absolute_url(), data=data)
+            page = response.context['products']
+            pks.extend(entry.pk for entry in page)
+            if not page.has_next():
+                break
+            data = {'cursor': page.next_cursor}
+        self.assertEqual(pks, expected)
+
+    def test_last_modified_follows_sidebar(self):
+        url = self.notebook.get_absolute_url()
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        with mock.patch('mainapp.cache.time.time_ns', return_value=time.time_ns() + 10 ** 10):
+            sidebar_counts.invalidate()
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_logout_invalidates_etag(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'password')
+        url = self.notebook.get_absolute_url()
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertContains(response, 'Выйти')
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.client.post(reverse('logout'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Выйти')
+        # Гостевая страница до входа: If-Modified-Since без ETag
+        last_modified = response['Last-Modified']
+        self.client.force_login(user)
+        get_user_model().objects.filter(pk=user.pk).update(last_login=timezone.now() + timedelta(seconds=10))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertContains(response, 'Выйти')
+
+    def test_search(self):
+        self.assertMaxQueries(5, reverse('search'), data={'q': 'Lenovo'})
+
+    def test_cart(self):
+        self.assertMaxQueries(3, reverse('cart'))
+
+
+class AdminQueryCountTests(QueryCountTestCase):
+    max_queries = 5
+    max_queries_by_model = {
+        'auth.User': 6,
+        # Товары строк корзины: по одному IN-запросу на тип
+        'mainapp.CartProduct': 7,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        customer = Customer.objects.create(user=cls.user, phone='+70000000000', address='Москва')
+        cart = Cart.objects.create(owner=customer)
+        for product in [*Notebook.objects.all()[:5], *Smartphone.objects.all()[:5]]:
+            CartProduct.objects.create(user=customer, cart=cart, content_object=product, final_price=product.price)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_changelists(self):
+        for model in admin.site._registry:
+            opts = model._meta
+            with self.subTest(model=opts.label):
+                self.assertMaxQueries(
+                    self.max_queries_by_model.get(opts.label, self.max_queries),
+                    reverse('admin:{}_{}_changelist'.format(opts.app_label, opts.model_name)))
+
+
+class CustomerLoginTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'password')
+
+    def test_checkout_redirects_to_customer_login(self):
+        response = self.client.get(reverse('checkout'))
+        self.assertRedirects(response, '{}?next={}'.format(reverse('login'), reverse('checkout')))
+
+    def test_customer_can_log_in_and_checkout(self):
+        response = self.client.post(reverse('login'), {
+            'username': 'buyer', 'password': 'password', 'next': reverse('checkout'),
+        })
+        self.assertRedirects(response, reverse('checkout'))
+        self.assertEqual(self.client.get(reverse('checkout')).status_code, 200)
+
+
+class OrderTestCase(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.customer = Customer.objects.create(user=user, phone='+70000000000', address='Москва')
+        category = Category.object.create(name='Ноутбуки', slug='notebook')
+        self.notebook = Notebook.objects.create(
+            category=category, title='Notebook', slug='notebook-1', image='products/notebook.png', price=100)
+        self.cart = CartService.for_customer(self.customer)
+
+
+class GetCustomerTests(TestCase):
+
+    def test_existing_customer_is_reused(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'password')
+        customer = get_customer(user)
+        self.assertEqual(get_customer(user), customer)
+        self.assertEqual(Customer.objects.filter(user=user).count(), 1)
+
+    def test_concurrent_create(self):
+        user = get_user_model().objects.create_user('buyer', 'buyer@example.com', 'password')
+        customer = Customer.objects.create(user=user)
+        # Параллельный запрос создал покупателя между SELECT и INSERT
+        with mock.patch.object(Customer.objects, 'get_or_create', side_effect=IntegrityError):
+            self.assertEqual(get_customer(user), customer)
+
+
+class PlaceOrderTests(OrderTestCase):
+
+    def test_order_uses_current_prices(self):
+        self.cart.add(self.notebook, 2)
+        Notebook.objects.filter(pk=self.notebook.pk).update(price=150)
+        order = place_order(self.customer, 'key-1', '+70000000000', 'Москва')
+        self.assertEqual(order.total_products, 2)
+        self.assertEqual(order.final_price, 300)
+        self.assertEqual(CartProduct.objects.get(cart=order.cart).final_price, 300)
+
+    def test_untracked_stock_is_not_reserved(self):
+        self.cart.add(self.notebook, 3)
+        place_order(self.customer, 'key-1', '+70000000000', 'Москва')
+        self.notebook.refresh_from_db()
+        self.assertIsNone(self.notebook.stock)
+
+    def test_tracked_stock(self):
+        Notebook.objects.filter(pk=self.notebook.pk).update(stock=2)
+        self.cart.add(self.notebook, 3)
+        with self.assertRaises(OutOfStockError):
+            place_order(self.customer, 'key-1', '+70000000000', 'Москва')
+        self.cart.set_quantity(self.notebook, 2)
+        place_order(self.customer, 'key-2', '+70000000000', 'Москва')
+        self.notebook.refresh_from_db()
+        self.assertEqual(self.notebook.stock, 0)
+
+    def test_deleted_product(self):
+        self.cart.add(self.notebook)
+        self.notebook.delete()
+        with self.assertRaises(ProductUnavailableError):
+            place_order(self.customer, 'key-1', '+70000000000', 'Москва')
+
+
+class OutboxTests(OrderTestCase):
+
+    def test_claimed_events_are_not_claimed_again(self):
+        OutboxEvent.objects.create(topic='unknown')
+        self.assertEqual(len(claim_events()), 1)
+        self.assertEqual(claim_events(), [])
+
+    def test_order_email_is_sent_once(self):
+        self.cart.add(self.notebook)
+        place_order(self.customer, 'key-1', '+70000000000', 'Москва')
+        self.assertEqual(process_outbox(), 1)
+        self.assertEqual(process_outbox(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        event = OutboxEvent.objects.get(topic=ORDER_PLACED)
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.attempts, 1)
+
+    def test_failed_event_is_released(self):
+        OutboxEvent.objects.create(topic=ORDER_PLACED, payload={'order_id': 0})
+        self.assertEqual(process_outbox(), 0)
+        event = OutboxEvent.objects.get()
+        self.assertIsNone(event.locked_until)
+        self.assertIsNone(event.processed_at)
+        self.assertTrue(event.last_error)
+        self.assertEqual(len(claim_events()), 1)
+
+
+class CartServiceTests(OrderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.smartphone = Smartphone.objects.create(
+            category=self.notebook.category, title='Smartphone', slug='smartphone-1',
+            image='products/smartphone.png', price=50)
+
+    def assertTotals(self, total_products, final_price):
+        # Итоги корзины всегда равны сумме ее строк
+        self.assertEqual((self.cart.total_products, self.cart.final_price), (total_products, final_price))
+        self.cart.recalculate()
+        self.assertEqual((self.cart.total_products, self.cart.final_price), (total_products, final_price))
+
+    def test_add(self):
+        self.cart.add(self.notebook)
+        self.cart.add(self.notebook, 2)
+        self.cart.add(self.smartphone)
+        self.assertEqual(CartProduct.objects.filter(cart=self.cart.cart).count(), 2)
+        self.assertEqual([line['qtr'] for line in self.cart.lines()], [3, 1])
+        self.assertTotals(4, 350)
+
+    def test_set_quantity(self):
+        self.cart.add(self.notebook, 3)
+        self.cart.set_quantity(self.notebook, 1)
+        self.cart.set_quantity(self.smartphone, 2)
+        self.assertTotals(3, 200)
+        self.cart.set_quantity(self.notebook, 0)
+        self.assertEqual([line['product'] for line in self.cart.lines()], [self.smartphone])
+        self.assertTotals(2, 100)
+
+    def test_remove(self):
+        self.cart.add(self.notebook, 2)
+        self.cart.add(self.smartphone)
+        self.cart.remove(self.notebook)
+        self.cart.remove(self.notebook)
+        self.assertTotals(1, 50)
+        self.cart.remove(self.smartphone)
+        self.assertEqual(self.cart.lines(), [])
+        self.assertTotals(0, 0)
+
+
+class AnonymousCartTests(OrderTestCase):
+
+    def test_totals_use_one_load(self):
+        smartphone = Smartphone.objects.create(
+            category=self.notebook.category, title='Smartphone', slug='smartphone-1',
+            image='products/smartphone.png', price=50)
+        cart = AnonymousCart()
+        cart.add(self.notebook, 2)
+        cart.add(smartphone)
+        with self.assertNumQueries(2):
+            self.assertEqual((cart.total_products, cart.final_price), (3, 250))
+            self.assertEqual(len(cart.lines()), 2)
+
+    def test_deleted_products_are_dropped(self):
+        cart = AnonymousCart({(product_types.for_model(Notebook).content_type_id, self.notebook.pk + 1): 5})
+        cart.add(self.notebook)
+        self.assertEqual((cart.total_products, cart.final_price), (1, 100))
+        self.assertEqual(len(cart.items), 1)
+        self.assertTrue(cart.modified)
+
+
+class SearchBackendTests(QueryCountTestCase):
+    products_per_type = 3
+
+    def test_reindex_replaces_document(self):
+        backend = get_search_backend()
+        if not isinstance(backend, SqliteFTS5Backend):
+            self.skipTest('Проверка для SQLite FTS5')
+        product = Notebook.objects.order_by('pk').first()
+        product_type = product_types.for_model(Notebook)
+        entry = CatalogEntry.objects.get(content_type_id=product_type.content_type_id, object_id=product.pk)
+        document = dict(get_document(product, product_type), title_stems='уникальноеслово')
+        backend.index(entry.pk, document)
+        backend.index(entry.pk, document)
+        self.assertEqual(backend.search('уникальноеслово'), [entry.pk])
+        backend.remove([entry.pk])
+        self.assertEqual(backend.search('уникальноеслово'), [])
+
+    def test_like_backend(self):
+        backend = LikeSearchBackend()
+        backend.index(1, {})
+        product = Notebook.objects.order_by('pk').first()
+        self.assertTrue(backend.search(product.title))
+        self.assertEqual(backend.search('несуществующий'), [])
+
+
+class CatalogImportTests(QueryCountTestCase):
+    products_per_type = 3
+
+    def test_import_syncs_only_imported_products(self):
+        notebook, new = [row for row in export_rows() if row['type'] == 'notebook'][:2]
+        notebook['title'] = 'Обновленный ноутбук'
+        new.update(slug='imported-notebook', title='Импортированный ноутбук')
+        untouched = dict(CatalogEntry.objects.exclude(slug=notebook['slug']).values_list('pk', 'title'))
+        stats = CatalogImporter(workers=1).run([notebook, new])
+        self.assertEqual((stats.created, stats.updated, stats.errors), (1, 1, 0))
+        self.assertEqual(CatalogEntry.objects.get(slug=notebook['slug']).title, 'Обновленный ноутбук')
+        entry = CatalogEntry.objects.get(slug='imported-notebook')
+        self.assertTrue(entry.spec_values.exists())
+        self.assertEqual(get_search_backend().search('Импортированный'), [entry.pk])
+        self.assertEqual(
+            dict(CatalogEntry.objects.filter(pk__in=untouched).values_list('pk', 'title')), untouched)
+
+    def test_invalid_jsonl_lines_are_row_errors(self):
+        row = next(row for row in export_rows() if row['type'] == 'notebook')
+        row['title'] = 'Обновленный ноутбук'
+        stream = io.StringIO('{"type": \n[1]\n' + json.dumps(row, default=str) + '\n')
+        errors = []
+        stats = CatalogImporter(workers=1, on_error=lambda number, message: errors.append(number)).run(
+            read_jsonl(stream))
+        self.assertEqual((stats.rows, stats.updated, stats.errors), (3, 1, 2))
+        self.assertEqual(errors, [1, 2])
+        self.assertEqual(CatalogEntry.objects.get(slug=row['slug']).title, 'Обновленный ноутбук')
+
+
+class MissingReplicaRouter:
+    """
+    Чтение каталога с несуществующей базы: любое чтение перед записью падает.
+    """
+
+    def db_for_read(self, model, **hints):
+        return 'replica' if model._meta.app_label == 'mainapp' else None
+
+
+class WriteReadsPrimaryTests(TestCase):
+
+    def test_product_save_reads_from_primary(self):
+        category = Category.object.create(name='Ноутбуки', slug='notebook')
+        notebook = Notebook.objects.create(
+            category=category, title='Notebook', slug='notebook-1', image='products/notebook.png', price=100)
+        with override_settings(DATABASE_ROUTERS=['mainapp.tests.MissingReplicaRouter']):
+            notebook.title = 'Notebook 2'
+            notebook.save()
+            notebook.delete()
+        self.assertFalse(CatalogEntry.objects.exists())
+
+
+@mock.patch('mainapp.assets.rcssmin', None)
+class MinifyCssTests(SimpleTestCase):
+
+    def test_strings_are_kept(self):
+        self.assertEqual(
+            minify_css('a  {\n  content: "a  b" ;\n  font-family: \'x  /* y */\';\n}'),
+            'a{content: "a  b";font-family: \'x  /* y */\'}')
+
+    def test_comments(self):
+        self.assertEqual(minify_css("/*! license */\n/* it's */\na , b { color: red; }"),
+                         '/*! license */ a,b{color: red}')
+
+
+class InstrumentationTests(QueryCountTestCase):
+    products_per_type = 3
+
+    def test_sampled_request(self):
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=1), self.assertLogs('mainapp.instrumentation'):
+            client = self.client_class()
+            client.get(reverse('base'))
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(reverse('base'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('"{} queries"'.format(len(queries)), response['Server-Timing'])
+        self.assertNotIn('"0 hit', response['Server-Timing'])
+        self.assertNotIn('tpl;dur=0.0', response['Server-Timing'])
+        self.assertNotIn(instrumentation.query_wrapper, connection.execute_wrappers)
+
+    def test_track_outside_sample(self):
+        with instrumentation.track():
+            self.assertNotIn(instrumentation.query_wrapper, connection.execute_wrappers)
+
+
+class ConnectionHealthTests(SimpleTestCase):
+
+    @staticmethod
+    def make_connection(health_checks, usable):
+        connection = mock.Mock(settings_dict={'CONN_HEALTH_CHECKS': health_checks}, in_atomic_block=False)
+        connection.is_usable.return_value = usable
+        return connection
+
+    def test_broken_connection_is_closed(self):
+        broken, alive, unchecked = (
+            self.make_connection(True, False), self.make_connection(True, True), self.make_connection(False, False))
+        with mock.patch('shop.db.health.connections') as connections:
+            connections.all.return_value = [broken, alive, unchecked]
+            check_connections()
+        broken.close.assert_called_once_with()
+        alive.close.assert_not_called()
+        unchecked.is_usable.assert_not_called()
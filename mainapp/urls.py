@@ -1,8 +1,27 @@
+from django.conf import settings
+from django.contrib.auth.views import LogoutView
 from django.urls import path
 from .views import *
+from . import async_views
+
+if getattr(settings, 'ASYNC_CATALOG_VIEWS', False):
+    catalog_views = (
+        async_views.base_view, async_views.product_detail_view, async_views.category_detail_view)
+else:
+    catalog_views = (BaseView.as_view(), ProductDetailView.as_view(), CategoryDetailView.as_view())
 
 urlpatterns = [
-    path('', BaseView.as_view(), name='base'),
-    path('products/<str:ct_model>/<str:slug>/', ProductDetailView.as_view(), name='product_detail'),
-    path('category/<str:slug>/', CategoryDetailView.as_view(), name='category_detail')
+    path('', catalog_views[0], name='base'),
+    path('products/<str:ct_model>/<str:slug>/', catalog_views[1], name='product_detail'),
+    path('category/<str:slug>/', catalog_views[2], name='category_detail'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('search/suggest/', SearchSuggestView.as_view(), name='search_suggest'),
+    path('cart/', CartView.as_view(), name='cart'),
+    path('cart/add/<str:ct_model>/<str:slug>/', AddToCartView.as_view(), name='add_to_cart'),
+    path('cart/change-qty/<str:ct_model>/<str:slug>/', ChangeQtyView.as_view(), name='change_qty'),
+    path('cart/remove/<str:ct_model>/<str:slug>/', DeleteFromCartView.as_view(), name='delete_from_cart'),
+    path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('orders/<int:pk>/', OrderDetailView.as_view(), name='order_detail'),
+    path('login/', CustomerLoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
 ]
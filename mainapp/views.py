@@ -1,35 +1,313 @@
-from django.shortcuts import render, redirect
+import mimetypes
+import os
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.views import LoginView
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
 from .models import *
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView, View, TemplateView, CreateView
-from .mixins import CategoryDetailsMixin
+from .assets import built_files, bundles_root
+from .cart import CartService, get_cart, get_customer
+from .forms import OrderForm
+from .instrumentation import histogram
+from .orders import CheckoutError, place_order
+from .facets import filter_by_specs, get_facets, parse_spec_filters
+from .mixins import CategoryDetailsMixin, ConditionalDetailMixin
+from .pagecache import HOME_TAG, SIDEBAR_TAG, add_page_tags, category_tag, product_tag
+from .pagination import InvalidCursor, KeysetPaginator
+from .registry import product_types
+from .search import get_search_backend, highlight
 
 
 class BaseView(View):
+    products_count = 6
+    carousel_count = 3
 
     def get(self, request, *args, **kwargs):
         categories = Category.object.get_categories_for_left_sidebar()
-        return render(request, 'base.html', {'categories': categories})
+        # Все типы товаров одним запросом UNION ALL (feed.get_feed)
+        products = self.get_products()
+        return self.render_page(request, categories, products)
 
+    @classmethod
+    def get_products(cls):
+        return LatestProducts.objects.get_products_for_main_page(count=cls.products_count)
 
-class ProductDetailView(CategoryDetailsMixin, DetailView):
-    CT_MODEL_MODEL_CLASS = {
-        'notebook': Notebook,
-        'smartphone': Smartphone
-    }
+    @classmethod
+    def render_page(cls, request, categories, products):
+        carousel = [product for product in products if product.image][:cls.carousel_count]
+        carousel_version = ','.join(
+            '{}:{}:{}:{}'.format(p.get_ct_model(), p.pk, p.updated_at.timestamp(), p.image_hash) for p in carousel)
+        add_page_tags(request, SIDEBAR_TAG, HOME_TAG)
+        return render(request, 'mainapp/index.html', {
+            'categories': categories,
+            'products': products,
+            'carousel': carousel,
+            'carousel_version': carousel_version,
+        })
+
+
+class ProductDetailView(ConditionalDetailMixin, CategoryDetailsMixin, DetailView):
 
-    def dispatch(self, request, *args, **kwargs):
-        self.model = self.CT_MODEL_MODEL_CLASS[kwargs['ct_model']]
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        self.model = product_types.get_or_404(kwargs['ct_model']).model
         self.queryset = self.model._base_manager.all()
-        return super().dispatch(request, *args, **kwargs)
 
     context_object_name = 'products'
     template_name = 'mainapp/product_detail.html'
     slug_url_kwarg = 'slug'
 
+    def get_version_parts(self):
+        # image_hash меняется без updated_at, когда готовы варианты изображения
+        return super().get_version_parts() + [self.object.image_hash]
+
+    def get_context_data(self, **kwargs):
+        add_page_tags(self.request, product_tag(self.object), category_tag(self.object.category_id), SIDEBAR_TAG)
+        return super().get_context_data(**kwargs)
+
+
+class CategoryDetailView(ConditionalDetailMixin, CategoryDetailsMixin, DetailView):
+    SORTING = {
+        'new': ('-created_at', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+    paginate_by = 12
 
-class CategoryDetailView(CategoryDetailsMixin, DetailView):
     model = Category
     queryset = Category.object.all()
     context_object_name = 'category'
     template_name = 'mainapp/category_detail.html'
     slug_url_kwarg = 'slug'
+
+    def get_price_filter(self, name):
+        try:
+            value = Decimal(self.request.GET[name])
+        except (KeyError, InvalidOperation):
+            return None
+        return value if value.is_finite() else None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        qs = CatalogEntry.objects.filter(category=self.object)
+        price_min = self.get_price_filter('price_min')
+        price_max = self.get_price_filter('price_max')
+        if price_min is not None:
+            qs = qs.filter(price__gte=price_min)
+        if price_max is not None:
+            qs = qs.filter(price__lte=price_max)
+        spec_values, spec_ranges = parse_spec_filters(self.request.GET)
+        price_filtered = price_min is not None or price_max is not None
+        facets = get_facets(self.object, qs, spec_values, spec_ranges, price_filtered)
+        qs = filter_by_specs(qs, spec_values, spec_ranges)
+        sort = self.request.GET.get('sort')
+        if sort not in self.SORTING:
+            sort = 'new'
+        paginator = KeysetPaginator(qs, self.SORTING[sort], self.paginate_by)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Некорректная страница')
+        next_url = None
+        if page.has_next():
+            params = self.request.GET.copy()
+            params['cursor'] = page.next_cursor
+            next_url = '?' + params.urlencode()
+        add_page_tags(self.request, category_tag(self.object.pk), SIDEBAR_TAG)
+        context.update({
+            'products': page,
+            'sort': sort,
+            'price_min': price_min,
+            'price_max': price_max,
+            'next_url': next_url,
+            'facets': facets,
+        })
+        return context
+
+
+class SearchView(View):
+    paginate_by = 20
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        products = []
+        if query:
+            entry_ids = get_search_backend().search(query, limit=self.paginate_by)
+            entries = CatalogEntry.objects.in_bulk(entry_ids)
+            products = [entries[entry_id] for entry_id in entry_ids if entry_id in entries]
+            for product in products:
+                product.highlighted_title = highlight(product.title, query)
+        categories = Category.object.get_categories_for_left_sidebar()
+        return render(request, 'mainapp/search.html', {'categories': categories, 'query': query, 'products': products})
+
+
+class SearchSuggestView(View):
+    limit = 10
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        results = []
+        if query:
+            entry_ids = get_search_backend().suggest(query, limit=self.limit)
+            entries = CatalogEntry.objects.in_bulk(entry_ids)
+            results = [
+                dict(title=entries[entry_id].title, url=entries[entry_id].get_absolute_url())
+                for entry_id in entry_ids if entry_id in entries
+            ]
+        return JsonResponse({'results': results})
+
+
+class CartView(View):
+
+    def get(self, request, *args, **kwargs):
+        cart = get_cart(request)
+        categories = Category.object.get_categories_for_left_sidebar()
+        return render(request, 'mainapp/cart.html', {'categories': categories, 'cart': cart, 'lines': cart.lines()})
+
+
+class CartActionMixin(View):
+    http_method_names = ['post']
+
+    def get_product(self):
+        model = product_types.get_or_404(self.kwargs['ct_model']).model
+        return get_object_or_404(model._base_manager.all(), slug=self.kwargs['slug'])
+
+    def get_qty(self):
+        try:
+            return int(self.request.POST.get('qty', 1))
+        except ValueError:
+            return 1
+
+    def post(self, request, *args, **kwargs):
+        try:
+            self.change_cart(get_cart(request), self.get_product())
+        except ValueError:
+            pass
+        return redirect('cart')
+
+
+class AddToCartView(CartActionMixin):
+
+    def change_cart(self, cart, product):
+        cart.add(product, max(self.get_qty(), 1))
+
+
+class ChangeQtyView(CartActionMixin):
+
+    def change_cart(self, cart, product):
+        cart.set_quantity(product, self.get_qty())
+
+
+class DeleteFromCartView(CartActionMixin):
+
+    def change_cart(self, cart, product):
+        cart.remove(product)
+
+
+class CheckoutView(LoginRequiredMixin, View):
+
+    def render(self, request, form, error=None):
+        cart = CartService.for_customer(get_customer(request.user))
+        categories = Category.object.get_categories_for_left_sidebar()
+        return render(request, 'mainapp/checkout.html', {
+            'categories': categories, 'cart': cart, 'lines': cart.lines(), 'form': form, 'error': error,
+        })
+
+    def get(self, request, *args, **kwargs):
+        customer = get_customer(request.user)
+        form = OrderForm(initial={
+            'phone': customer.phone, 'address': customer.address, 'idempotency_key': uuid.uuid4().hex,
+        })
+        return self.render(request, form)
+
+    def post(self, request, *args, **kwargs):
+        form = OrderForm(request.POST)
+        if not form.is_valid():
+            return self.render(request, form)
+        customer = get_customer(request.user)
+        try:
+            order = place_order(customer, form.cleaned_data['idempotency_key'],
+                                form.cleaned_data['phone'], form.cleaned_data['address'])
+        except CheckoutError as exc:
+            return self.render(request, form, error=str(exc))
+        return redirect('order_detail', pk=order.pk)
+
+
+class OrderDetailView(LoginRequiredMixin, DetailView):
+    context_object_name = 'order'
+    template_name = 'mainapp/order_detail.html'
+
+    def get_queryset(self):
+        return Order.objects.filter(customer__user=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['categories'] = Category.object.get_categories_for_left_sidebar()
+        return context
+
+
+class CustomerLoginView(LoginView):
+    """
+    Вход покупателей. Админский вход не подходит: он пускает только персонал.
+    """
+    template_name = 'mainapp/login.html'
+    redirect_authenticated_user = True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['categories'] = Category.object.get_categories_for_left_sidebar()
+        return context
+
+
+class AssetView(View):
+    """
+    Отдает собранные бандлы (build_assets) с заранее сжатой копией под
+    Accept-Encoding. Имя содержит хэш, поэтому кэшировать можно навсегда.
+    """
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+    max_age = 60 * 60 * 24 * 365
+
+    def get(self, request, name, *args, **kwargs):
+        if name not in built_files():
+            raise Http404('Файл не найден')
+        path = os.path.join(bundles_root(), name)
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        encoding = None
+        for candidate, suffix in self.ENCODINGS:
+            if candidate in accept_encoding and os.path.exists(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+        response = FileResponse(open(path, 'rb'), content_type=mimetypes.guess_type(name)[0], filename=name)
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(response, public=True, max_age=self.max_age, immutable=True)
+        return response
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class MetricsView(View):
+    """
+    Гистограмма метрик запросов по вью (InstrumentationMiddleware) для персонала.
+    ?reset=1 очищает накопленные данные.
+    """
+
+    def get(self, request, *args, **kwargs):
+        views = histogram.snapshot()
+        if request.GET.get('reset'):
+            histogram.reset()
+        response = JsonResponse({
+            'sample_rate': getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0),
+            'window': histogram.window,
+            'views': views,
+        }, json_dumps_params={'ensure_ascii': False, 'indent': 2})
+        patch_cache_control(response, private=True, no_store=True)
+        return response
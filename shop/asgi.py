@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+# Под ASGI-сервером страницы каталога обслуживают асинхронные вью
+os.environ.setdefault('ASYNC_CATALOG_VIEWS', '1')
 
 application = get_asgi_application()
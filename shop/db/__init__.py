@@ -0,0 +1,91 @@
+"""
+Профили базы данных, выбираются переменной окружения DB_PROFILE.
+
+sqlite (по умолчанию) - файл db.sqlite3;
+sqlite-wal - то же в режиме WAL для сервера с параллельными запросами. Режим
+хранится в самом файле базы, поэтому включается только явно: иначе любой запуск
+manage.py переписывал бы db.sqlite3 из репозитория;
+postgresql - постоянные соединения, параметры из DB_NAME, DB_USER, DB_PASSWORD,
+DB_HOST, DB_PORT. Если задан DB_REPLICA_HOST, добавляется база 'replica'
+для чтения каталога (см. shop.db.routers).
+"""
+import os
+
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+
+def env(name, default=None):
+    return os.environ.get(name, default)
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def sqlite_profile(base_dir):
+    return {
+        'default': {
+            'ENGINE': 'shop.db.sqlite3',
+            'NAME': env('DB_NAME', base_dir / 'db.sqlite3'),
+            'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 60),
+            'OPTIONS': {
+                'timeout': env_int('DB_BUSY_TIMEOUT', 5000) / 1000,
+            },
+            'PRAGMAS': dict(SQLITE_PRAGMAS, busy_timeout=env_int('DB_BUSY_TIMEOUT', 5000)),
+        }
+    }
+
+
+def sqlite_wal_profile(base_dir):
+    databases = sqlite_profile(base_dir)
+    databases['default']['PRAGMAS']['journal_mode'] = 'WAL'
+    return databases
+
+
+def postgresql_database(host, port):
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env('DB_NAME', 'shop'),
+        'USER': env('DB_USER', 'shop'),
+        'PASSWORD': env('DB_PASSWORD', ''),
+        'HOST': host,
+        'PORT': port,
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 600),
+        # Проверка соединения перед повторным использованием (shop.db.health, в Django 4.1+ - штатная)
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': env_int('DB_CONNECT_TIMEOUT', 5),
+        },
+    }
+
+
+def postgresql_profile(base_dir):
+    databases = {
+        'default': postgresql_database(env('DB_HOST', 'localhost'), env('DB_PORT', '5432')),
+    }
+    replica_host = env('DB_REPLICA_HOST')
+    if replica_host:
+        databases['replica'] = postgresql_database(replica_host, env('DB_REPLICA_PORT', env('DB_PORT', '5432')))
+        databases['replica']['TEST'] = {'MIRROR': 'default'}
+    return databases
+
+
+DATABASE_PROFILES = {
+    'sqlite': sqlite_profile,
+    'sqlite-wal': sqlite_wal_profile,
+    'postgresql': postgresql_profile,
+}
+
+
+def database_profile(base_dir):
+    profile = env('DB_PROFILE', 'sqlite')
+    try:
+        return DATABASE_PROFILES[profile](base_dir)
+    except KeyError:
+        raise ValueError('Неизвестный профиль базы данных DB_PROFILE={}'.format(profile))
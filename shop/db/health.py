@@ -0,0 +1,15 @@
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """
+    Проверка постоянных соединений перед запросом (request_started) для баз с
+    CONN_HEALTH_CHECKS. В Django 3.1 настройки нет: сам Django закрывает
+    соединение только после ошибки в нем, и первый запрос после обрыва со
+    стороны сервера БД падал бы. Неработающее соединение закрываем, Django
+    откроет новое при первом обращении.
+    """
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS') and connection.connection is not None
+                and not connection.in_atomic_block and not connection.is_usable()):
+            connection.close()
@@ -0,0 +1,23 @@
+CATALOG_MODELS = {'category', 'notebook', 'smartphone', 'catalogentry', 'specvalue'}
+
+
+class CatalogReadRouter:
+    """
+    Чтение каталога - с реплики 'replica', если она настроена, все остальное -
+    с основной базы. Корзина и заказы всегда читаются с основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        from django.conf import settings
+        if 'replica' in settings.DATABASES and model._meta.model_name in CATALOG_MODELS:
+            return 'replica'
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,14 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Стандартный бэкенд SQLite, который при открытии соединения выполняет
+    PRAGMA из ключа PRAGMAS настроек базы (см. shop.db.SQLITE_PRAGMAS).
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute('PRAGMA {} = {}'.format(name, value))
+        return conn
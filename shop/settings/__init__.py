@@ -0,0 +1,7 @@
+import os
+
+# DJANGO_ENV=prod - боевые настройки, по умолчанию - для разработки
+if os.environ.get('DJANGO_ENV', 'dev') == 'prod':
+    from .prod import *  # noqa
+else:
+    from .dev import *  # noqa
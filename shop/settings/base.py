@@ -0,0 +1,215 @@
+"""
+Django settings for shop project: общие настройки для всех окружений.
+Окружение выбирается переменной DJANGO_ENV (dev/prod), см. shop/settings/__init__.py
+
+Generated by 'django-admin startproject' using Django 3.1.5.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.1/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/3.1/ref/settings/
+"""
+import os
+from pathlib import Path
+
+from shop.db import database_profile
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def env(name, default=None):
+    return os.environ.get(name, default)
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default=''):
+    return [item.strip() for item in os.environ.get(name, default).split(',') if item.strip()]
+
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/3.1/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+# Запасной ключ есть только в dev.py, в prod.py DJANGO_SECRET_KEY обязателен
+SECRET_KEY = env('DJANGO_SECRET_KEY')
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = False
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS')
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'mainapp.apps.MainappConfig',
+    'django_admin_listfilter_dropdown',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'mainapp.middleware.InstrumentationMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'mainapp.middleware.AnonymousCartMiddleware',
+    'mainapp.middleware.PageCacheMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'shop.urls'
+
+TEMPLATES = [
+    {
+        # DjangoTemplates с учетом времени рендера (mainapp/instrumentation.py)
+        'BACKEND': 'mainapp.instrumentation.InstrumentedDjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'shop.wsgi.application'
+
+# Database
+# https://docs.djangoproject.com/en/3.1/ref/settings/#databases
+
+# Профиль выбирается переменной окружения DB_PROFILE (sqlite/sqlite-wal/postgresql), см. shop/db/__init__.py
+DATABASES = database_profile(BASE_DIR)
+
+DATABASE_ROUTERS = ['shop.db.routers.CatalogReadRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+# Бэкенд задается окружением, например:
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache CACHE_LOCATION=127.0.0.1:11211
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', 'shop'),
+        'KEY_PREFIX': env('CACHE_KEY_PREFIX', ''),
+        'TIMEOUT': int(env('CACHE_TIMEOUT', 300)),
+    },
+    # Кэш страниц (mainapp/pagecache.py): PAGE_CACHE_BACKEND=locmem или file
+    'pages': {
+        'BACKEND': {
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+        }[env('PAGE_CACHE_BACKEND', 'locmem')],
+        'LOCATION': env('PAGE_CACHE_LOCATION', os.path.join(BASE_DIR, 'var', 'pagecache')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(env('PAGE_CACHE_MAX_ENTRIES', 1000))},
+    },
+}
+
+PAGE_CACHE_ENABLED = env_bool('PAGE_CACHE', True)
+PAGE_CACHE_ALIAS = 'pages'
+PAGE_CACHE_TIMEOUT = int(env('PAGE_CACHE_TIMEOUT', 600))
+
+LOGIN_URL = 'login'
+LOGIN_REDIRECT_URL = 'base'
+LOGOUT_REDIRECT_URL = 'base'
+
+# Асинхронные страницы каталога (mainapp/async_views.py), включаются в shop/asgi.py
+ASYNC_CATALOG_VIEWS = env_bool('ASYNC_CATALOG_VIEWS', False)
+
+# Cache-Control страниц товаров и категорий для анонимных посетителей (mainapp/mixins.py)
+HTTP_CACHE_MAX_AGE = int(env('HTTP_CACHE_MAX_AGE', 0))
+HTTP_CACHE_SHARED_MAX_AGE = int(env('HTTP_CACHE_SHARED_MAX_AGE', 60))
+
+# Метрики запросов (mainapp/instrumentation.py): доля запросов в выборке от 0 до 1,
+# 0 - middleware ничего не делает
+INSTRUMENTATION_SAMPLE_RATE = float(env('INSTRUMENTATION_SAMPLE_RATE', 0))
+INSTRUMENTATION_SERVER_TIMING = env_bool('INSTRUMENTATION_SERVER_TIMING', True)
+INSTRUMENTATION_WINDOW = int(env('INSTRUMENTATION_WINDOW', 1000))
+
+# manage.py test: без метрик запросов (shop/test_runner.py)
+TEST_RUNNER = 'shop.test_runner.TestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'mainapp.instrumentation': {
+            'handlers': ['console'],
+            'level': env('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Password validation
+# https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+# Internationalization
+# https://docs.djangoproject.com/en/3.1/topics/i18n/
+
+LANGUAGE_CODE = 'ru'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/3.1/howto/static-files/
+
+STATIC_URL = '/static/'
+STATIC_ROOT = env('DJANGO_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+STATICFILES_DIRS = (
+    os.path.join(BASE_DIR, 'static'),
+)
+
+# Варианты изображений товаров (mainapp/images.py)
+IMAGE_WORKERS = 2
+IMAGE_RENDITIONS_ASYNC = True
@@ -0,0 +1,14 @@
+from .base import *  # noqa
+
+DEBUG = True
+
+# Ключ из репозитория годится только для разработки
+SECRET_KEY = env('DJANGO_SECRET_KEY', '97ha5u1fw6fhk1c17-%!ypavjy=4!um%jeiz-lw#s=()6yu)^x')
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1,[::1]')
+
+# Кэш страниц мешает править шаблоны, включается явно: PAGE_CACHE=1
+PAGE_CACHE_ENABLED = env_bool('PAGE_CACHE', False)
+
+# При разработке метрики в Server-Timing у каждого запроса
+INSTRUMENTATION_SAMPLE_RATE = float(env('INSTRUMENTATION_SAMPLE_RATE', 1))
@@ -0,0 +1,32 @@
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import *  # noqa
+
+DEBUG = False
+
+SECRET_KEY = env('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Задайте DJANGO_SECRET_KEY')
+
+if not ALLOWED_HOSTS:
+    raise ImproperlyConfigured('Задайте DJANGO_ALLOWED_HOSTS')
+
+# Шаблоны разбираются один раз на процесс
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Имена статики с хэшем содержимого, собираются collectstatic
+STATICFILES_STORAGE = 'shop.storage.ManifestStorage'
+
+SESSION_COOKIE_SECURE = env_bool('DJANGO_SECURE_COOKIES', True)
+CSRF_COOKIE_SECURE = env_bool('DJANGO_SECURE_COOKIES', True)
+SECURE_SSL_REDIRECT = env_bool('DJANGO_SSL_REDIRECT', False)
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+SECURE_HSTS_SECONDS = int(env('DJANGO_HSTS_SECONDS', 0))
+SECURE_CONTENT_TYPE_NOSNIFF = True
+X_FRAME_OPTIONS = 'DENY'
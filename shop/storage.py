@@ -0,0 +1,20 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import SuspiciousFileOperation
+
+
+class ManifestStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage, который оставляет как есть ссылки в CSS
+    на отсутствующие файлы (например, шрифты font-awesome, которых нет
+    в static/) вместо того чтобы прерывать collectstatic.
+    """
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def safe_converter(matchobj):
+            try:
+                return converter(matchobj)
+            except (ValueError, SuspiciousFileOperation):
+                return matchobj.group(0)
+        return safe_converter
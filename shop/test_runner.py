@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Тесты запускаются с настройками разработки, но без метрик запросов:
+    иначе каждый запрос тестового клиента пишет строку в лог. Тесты метрик
+    включают их через override_settings.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.INSTRUMENTATION_SAMPLE_RATE = 0
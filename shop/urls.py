@@ -18,8 +18,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from mainapp.assets import BUNDLES_DIR
+from mainapp.views import AssetView, MetricsView
+
 urlpatterns = [
+    path('admin/metrics/', MetricsView.as_view(), name='metrics'),
     path('admin/', admin.site.urls),
+    path('{}{}/<str:name>'.format(settings.STATIC_URL.lstrip('/'), BUNDLES_DIR), AssetView.as_view(), name='asset'),
     path('', include('mainapp.urls'))
 ]
 
@@ -1,3 +1,31 @@
 $('.carousel').carousel({
     interval: false,
-})
\ No newline at end of file
+})
+
+$('[data-suggest-url]').on('input', function () {
+    var input = $(this);
+    var list = $('#' + input.attr('list'));
+    if (input.val().length < 2) {
+        return;
+    }
+    // В поставке slim-сборка jQuery без ajax, поэтому fetch
+    var query = input.val();
+    var params = new URLSearchParams({q: query});
+    fetch(input.data('suggest-url') + '?' + params.toString(), {headers: {'Accept': 'application/json'}})
+        .then(function (response) {
+            return response.ok ? response.json() : {results: []};
+        })
+        .then(function (data) {
+            // Ответ на устаревший запрос не перетирает подсказки к новому вводу
+            if (input.val() !== query) {
+                return;
+            }
+            list.empty();
+            $.each(data.results, function (i, item) {
+                list.append($('<option>').attr('value', item.title));
+            });
+        })
+        .catch(function () {
+            // Подсказки необязательны: при ошибке сети просто не показываем их
+        });
+});